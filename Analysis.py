@@ -0,0 +1,87 @@
+#批量分析局面的接口：给出一批 (棋盘, 轮到走的一方)，返回每个局面的最佳着法和分数。
+#每次调用都用自己的 ChessAI 作为临时状态，不会改动传入的棋盘，也不和其他调用共享任何状态，
+#所以多个线程可以同时调用；局面多时可以用 AnalysisPool 分给多个进程。
+#用法: results = analyzePositions([(board, MAP_ENTRY_TYPE.MAP_PLAYER_ONE)], depth=5)
+#      with AnalysisPool(workers=4) as pool:
+#          results = pool.analyze(positions, depth=5)
+import multiprocessing
+import NumpyEval
+from MaxMin_AlphaBeta import *
+
+analysis_ai = None #进程池中每个工作进程自己的 ChessAI
+def initAnalysisWorker(chess_len, rule): #initAnalysisWorker函数：进程池的初始化函数。
+    global analysis_ai
+    analysis_ai = ChessAI(chess_len, rule=rule)
+def checkPositions(positions, chess_len): #checkPositions函数：检查棋盘大小，复制棋盘，返回 [(棋盘, 轮到走的一方)]。
+    checked = []
+    for board, turn in positions:
+        if len(board) != chess_len or any(len(row) != chess_len for row in board):
+            raise ValueError('board size must be %d x %d' % (chess_len, chess_len))
+        checked.append(([list(row) for row in board], MAP_ENTRY_TYPE(turn)))
+    return checked
+def analyzeBoard(ai, board, turn, depth, time_limit): #analyzeBoard函数：用 ai 分析一个局面，结果和之前分析过哪些局面无关。
+    ai.clearCache()
+    x, y = ai.findBestChess(board, turn, time_limit, depth)
+    return {
+        'move': (x, y),
+        'score': ai.search_score,
+        'eval': ai.evaluate(board, turn),
+        'depth': ai.search_depth,
+        'nodes': ai.belta,
+        'time': ai.search_time,
+    }
+def analyzeWorker(task): #analyzeWorker函数：在工作进程里分析一个局面。
+    board, turn, depth, time_limit = task
+    return analyzeBoard(analysis_ai, board, turn, depth, time_limit)
+def evaluateWorker(task): #evaluateWorker函数：在工作进程里计算一组局面的静态评分。
+    positions, backend = task
+    return evaluatePositions(positions, analysis_ai.len, backend, analysis_ai.rule)
+def analyzePositions(positions, depth=SEARCH_DEPTH, time_limit=None, chess_len=CHESS_LEN, rule=RULE):
+    #analyzePositions函数：在当前线程里依次分析 positions，返回每个局面的
+    # {'move': 最佳着法, 'score': 搜索分数, 'eval': 静态评分, 'depth': 搜索深度, 'nodes': 展开的节点数, 'time': 用时}。
+    # time_limit 和 depth 的含义同 findBestChess，rule 是 RULE_FREESTYLE 或 RULE_STANDARD。
+    ai = ChessAI(chess_len, rule=rule)
+    return [analyzeBoard(ai, board, turn, depth, time_limit) for board, turn in checkPositions(positions, chess_len)]
+def evaluatePositions(positions, chess_len=CHESS_LEN, backend=None, rule=RULE):
+    #evaluatePositions函数：返回每个局面对轮到走的一方的静态评分，和 ChessAI.evaluate 相同。
+    # backend 为 'numpy' 时用 NumpyEval 批量计算，为 'python' 时逐个调用 ChessAI.evaluate，
+    # 为 None 时装了 NumPy 并且是无禁手规则就用 NumPy。
+    positions = checkPositions(positions, chess_len)
+    if backend is None:
+        backend = 'numpy' if NumpyEval.available() and rule == RULE_FREESTYLE else 'python'
+    if backend == 'numpy':
+        if rule != RULE_FREESTYLE:
+            raise ValueError('the numpy backend only supports the %s rule' % RULE_FREESTYLE)
+        scores = NumpyEval.getEvaluator(chess_len).evaluate([board for board, turn in positions],
+                                                            [turn for board, turn in positions])
+        return [int(score) for score in scores]
+    if backend != 'python':
+        raise ValueError('unknown backend %r' % backend)
+    ai = ChessAI(chess_len, rule=rule)
+    return [ai.evaluate(board, turn) for board, turn in positions]
+
+class AnalysisPool():
+    #AnalysisPool类：常驻的进程池，每个进程有一个 ChessAI，局面按顺序分给各进程，结果按输入的顺序返回。
+    # 进程池只在创建时启动一次；analyze 和 evaluate 可以在多个线程里同时调用。
+    def __init__(self, chess_len=CHESS_LEN, workers=None, rule=RULE):
+        self.len = chess_len
+        self.rule = rule
+        self.workers = workers or multiprocessing.cpu_count()
+        self.pool = multiprocessing.Pool(self.workers, initializer=initAnalysisWorker, initargs=(chess_len, rule))
+    def analyze(self, positions, depth=SEARCH_DEPTH, time_limit=None): #analyze函数：同 analyzePositions。
+        tasks = [(board, turn, depth, time_limit) for board, turn in checkPositions(positions, self.len)]
+        return self.pool.map(analyzeWorker, tasks)
+    def evaluate(self, positions, backend=None): #evaluate函数：同 evaluatePositions，局面平均分成 workers 份。
+        positions = checkPositions(positions, self.len)
+        size = max(1, (len(positions) + self.workers - 1) // self.workers)
+        tasks = [(positions[i:i + size], backend) for i in range(0, len(positions), size)]
+        return [score for scores in self.pool.map(evaluateWorker, tasks) for score in scores]
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
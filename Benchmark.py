@@ -0,0 +1,268 @@
+#固定局面的基准测试：按固定深度搜索，记录节点数、用时和选择的着法，可以和之前保存的结果比较
+#用法: python Benchmark.py --output bench.json
+#      python Benchmark.py --compare bench.json
+#      python Benchmark.py --reach 5,7   （不做选择性搜索按深度 5 和打开 LMR、无用剪枝按深度 7 比较用时和战术局面的着法）
+#      python Benchmark.py --check-pvs   （主要变例搜索、渴望窗口和普通 alpha-beta 搜索的分数、着法必须相同）
+import argparse
+import json
+import platform
+import sys
+import time
+from MaxMin_AlphaBeta import *
+
+def pair(blacks, whites): #pair函数：把黑棋和白棋的着法交替排成一局棋的着法顺序。
+    steps = []
+    for i in range(max(len(blacks), len(whites))):
+        if i < len(blacks):
+            steps.append(blacks[i])
+        if i < len(whites):
+            steps.append(whites[i])
+    return steps
+# 基准局面：steps 是从空棋盘开始黑先的着法，轮到哪一方由着法个数决定；expect 是战术局面的正确着法，
+# threat 为 True 的是进攻方有必胜的局面，同时检查 VCF/VCT 能否找到；threat_only 为 True 的局面普通搜索找不到，只用 VCF/VCT 检查 expect
+POSITIONS = [
+    {'name': 'opening_center', 'kind': 'opening', 'steps': [(7, 7)], 'depths': (3, 5)},
+    {'name': 'opening_direct', 'kind': 'opening', 'steps': [(7, 7), (7, 6), (8, 6)], 'depths': (3, 5)},
+    {'name': 'opening_indirect', 'kind': 'opening', 'steps': [(7, 7), (8, 6), (8, 8)], 'depths': (3, 5)},
+    {'name': 'midgame_a', 'kind': 'midgame', 'depths': (3, 5),
+     'steps': [(8, 8), (5, 7), (9, 8), (7, 9), (8, 9), (8, 7), (10, 7), (7, 10), (11, 6), (12, 5)]},
+    {'name': 'midgame_b', 'kind': 'midgame', 'depths': (3, 5),
+     'steps': [(5, 5), (5, 7), (6, 5), (7, 5), (6, 6), (7, 7), (7, 6), (8, 6), (8, 7), (5, 4), (6, 4), (6, 7)]},
+    {'name': 'midgame_c', 'kind': 'midgame', 'depths': (3, 5),
+     'steps': [(6, 9), (9, 6), (7, 10), (8, 11), (7, 9), (7, 11), (6, 11), (8, 9), (6, 10), (6, 8)]},
+    {'name': 'tactic_four_four', 'kind': 'tactic', 'depths': (3, 5), 'expect': (7, 7), 'threat': True,
+     'steps': pair([(4, 7), (5, 7), (6, 7), (7, 4), (7, 5), (7, 6)], [(3, 7), (7, 3), (11, 11), (12, 11), (11, 12), (12, 13)])},
+    {'name': 'tactic_block_four', 'kind': 'tactic', 'depths': (3, 5), 'expect': (8, 7),
+     'steps': pair([(8, 2), (6, 6), (6, 8), (10, 10)], [(8, 3), (8, 4), (8, 5), (8, 6)])},
+    {'name': 'tactic_four_three', 'kind': 'tactic', 'depths': (3, 5), 'expect': (8, 7), 'threat': True,
+     'steps': pair([(5, 7), (6, 7), (7, 7), (8, 5), (8, 6)], [(4, 7), (11, 11), (12, 12), (2, 2), (12, 2)])},
+    # 连续四次冲四才能取胜，普通搜索到深度 9 也找不到，VCF 可以
+    {'name': 'tactic_vcf', 'kind': 'tactic', 'depths': (3, 5), 'expect': (4, 5), 'threat': True, 'threat_only': True,
+     'steps': [(6, 8), (8, 7), (8, 6), (8, 9), (7, 7), (5, 9), (6, 9), (6, 7), (7, 8), (7, 6),
+               (5, 8), (8, 8), (4, 7), (7, 10), (4, 8), (3, 8), (4, 6), (4, 9), (5, 7), (7, 9)]},
+    # 不做选择性搜索时深度 5 只看到活四，深度 7 才看到必胜；用来检查 LMR 和无用剪枝后深度 7 仍然能看到
+    {'name': 'tactic_deep_win', 'kind': 'tactic', 'depths': (5, 7), 'expect': (3, 5),
+     'steps': pair([(4, 3), (7, 3), (6, 4), (2, 5), (4, 5), (6, 5), (7, 5), (4, 6), (6, 6), (7, 7)],
+                   [(3, 4), (1, 5), (5, 5), (3, 6), (3, 7), (5, 7), (6, 7), (3, 8), (7, 8), (7, 9)])},
+    {'name': 'tactic_defend', 'kind': 'tactic', 'depths': (5, 7), 'expect': (8, 7),
+     'steps': pair([(7, 4), (8, 5), (10, 5), (7, 6), (5, 7), (6, 7), (7, 7), (9, 7), (4, 8)],
+                   [(9, 4), (6, 5), (7, 5), (6, 6), (8, 6), (9, 6), (3, 8), (6, 8)])},
+]
+POSITION_SIZE = 15 #基准局面是按这个大小的棋盘写的，更小的棋盘放不下
+def boardOffset(chess_len): #boardOffset函数：基准局面在更大的棋盘上整体平移到中间。
+    return (chess_len - POSITION_SIZE) // 2
+def boardFromSteps(steps, chess_len=CHESS_LEN): #boardFromSteps函数：按着法摆出棋盘，返回 (棋盘, 轮到走的一方)。
+    board = [[0 for x in range(chess_len)] for y in range(chess_len)]
+    offset = boardOffset(chess_len)
+    for i, (x, y) in enumerate(steps):
+        board[y + offset][x + offset] = 1 if i % 2 == 0 else 2
+    if len(steps) % 2 == 0:
+        return board, MAP_ENTRY_TYPE.MAP_PLAYER_ONE
+    return board, MAP_ENTRY_TYPE.MAP_PLAYER_TWO
+def runPosition(ai, position, depth, repeat=1): #runPosition函数：对一个局面按 depth 搜索 repeat 次，取最短用时。
+    best_time = None
+    offset = boardOffset(ai.len)
+    expect = (position['expect'][0] + offset, position['expect'][1] + offset) if 'expect' in position else None
+    for i in range(repeat):
+        board, turn = boardFromSteps(position['steps'], ai.len)
+        ai.clearCache()
+        ai.point_cache.clear() #每次都从空的缓存开始，用时才能和其他重复、其他局面比较
+        ai.alpha = ai.belta = 0
+        if ai.stats is not None:
+            ai.stats.reset()
+        start = time.perf_counter()
+        score, x, y = ai.search(board, turn, depth)
+        elapsed = time.perf_counter() - start
+        if best_time is None or elapsed < best_time:
+            best_time = elapsed
+    result = {
+        'name': position['name'],
+        'kind': position['kind'],
+        'depth': depth,
+        'nodes': ai.belta,
+        'generated': ai.alpha,
+        'time': best_time,
+        'nps': ai.belta / best_time if best_time > 0 else 0,
+        'move': [x, y],
+        'score': score,
+    }
+    if 'expect' in position and not position.get('threat_only'):
+        result['ok'] = (x, y) == expect
+    if position.get('threat'):
+        board, turn = boardFromSteps(position['steps'], ai.len)
+        start = time.perf_counter()
+        move = ai.findThreatWin(board, turn, True)
+        result['threat_time'] = time.perf_counter() - start
+        result['threat_nodes'] = ai.threat_nodes
+        result['threat_move'] = list(move) if move is not None else None
+        result['threat_ok'] = move == expect
+    if ai.stats is not None:
+        ai.stats.search_time = elapsed
+        result['stats'] = ai.stats.summary()
+        result['stats']['point_cache'] = ai.point_cache.summary()
+    return result
+def runBenchmark(positions=POSITIONS, depths=None, repeat=1, chess_len=CHESS_LEN, stats=False, rule=RULE, selective=False):
+    #runBenchmark函数：跑所有局面，depths 为 None 时用每个局面自带的深度；stats 为 True 时附带搜索统计（计时会变慢）。
+    # selective 为 True 时打开 LMR 和无用剪枝，否则每个着法都搜索到完整深度。
+    ai = ChessAI(chess_len, rule=rule)
+    ai.enableStats(stats)
+    ai.use_lmr = ai.use_futility = selective
+    results = []
+    for position in positions:
+        for depth in (depths or position['depths']):
+            results.append(runPosition(ai, position, depth, repeat))
+    return {'version': 1, 'python': platform.python_version(), 'time': time.time(), 'size': chess_len, 'rule': rule,
+            'selective': selective, 'results': results}
+def compareReach(positions, base_depth, deep_depth, repeat=1, chess_len=CHESS_LEN, rule=RULE):
+    #compareReach函数：每个局面关掉选择性搜索按 base_depth 搜索，打开时按 deep_depth 搜索，返回 (报告的每一行, 是否达标)。
+    # 达标要求打开选择性搜索后总用时不超过原来，并且原来解对的战术局面仍然解对。计时有误差，repeat 取大一些。
+    base = runBenchmark(positions, [base_depth], repeat, chess_len, rule=rule, selective=False)['results']
+    deep = runBenchmark(positions, [deep_depth], repeat, chess_len, rule=rule, selective=True)['results']
+    lines = []
+    passed = True
+    for b, d in zip(base, deep):
+        flags = []
+        if b.get('ok') and not d.get('ok'):
+            flags.append('WRONG')
+            passed = False
+        if d['move'] != b['move']:
+            flags.append('move %s->%s' % (tuple(b['move']), tuple(d['move'])))
+        lines.append('%-20s d%d %7d nodes %.3fs  ->  d%d %7d nodes %.3fs  score %7d -> %7d  %s' % (
+            b['name'], base_depth, b['nodes'], b['time'], deep_depth, d['nodes'], d['time'], b['score'], d['score'], ' '.join(flags)))
+    base_time = sum(r['time'] for r in base)
+    deep_time = sum(r['time'] for r in deep)
+    if deep_time > base_time:
+        passed = False
+    lines.append('total d%d %d nodes %.3fs, d%d with reductions %d nodes %.3fs (%.2fx, %s)' % (
+        base_depth, sum(r['nodes'] for r in base), base_time, deep_depth, sum(r['nodes'] for r in deep), deep_time,
+        deep_time / base_time if base_time > 0 else 0, 'within' if deep_time <= base_time else 'OVER'))
+    return lines, passed
+def searchOnce(ai, position, depth, guess=None): #searchOnce函数：清空缓存后对局面按 depth 搜索一次，返回 (分数, 着法, 节点数)。
+    board, turn = boardFromSteps(position['steps'], ai.len)
+    ai.clearCache()
+    ai.alpha = ai.belta = 0
+    score, x, y = ai.search(board, turn, depth, guess=guess)
+    return score, [x, y], ai.belta
+def comparePVS(positions, depths=None, chess_len=CHESS_LEN, rule=RULE):
+    #comparePVS函数：每个局面先用普通 alpha-beta 搜索，再打开主要变例搜索、并分别以真实分数和它上下两倍 ASPIRATION_WINDOW
+    # 为渴望窗口中心搜索（窗口命中、分数偏低、分数偏高三种情况），返回 (报告的每一行, 是否达标)。
+    # 达标要求分数和着法全部相同，并且每个局面主要变例搜索展开的节点都不比普通 alpha-beta 多。选择性搜索会改变结果，比较时关掉。
+    ai = ChessAI(chess_len, rule=rule)
+    ai.use_lmr = ai.use_futility = False
+    lines = []
+    passed = True
+    total = [0, 0]
+    for position in positions:
+        for depth in (depths or position['depths']):
+            ai.use_pvs = False
+            plain = searchOnce(ai, position, depth)
+            ai.use_pvs = True
+            pvs = searchOnce(ai, position, depth)
+            flags = []
+            for name, result in [('pvs', pvs)] + [('guess %+d' % offset, searchOnce(ai, position, depth, plain[0] + offset))
+                                                  for offset in (0, -2 * ASPIRATION_WINDOW, 2 * ASPIRATION_WINDOW)]:
+                if result[:2] != plain[:2]:
+                    flags.append('DIFF %s: score %d move %s' % (name, result[0], tuple(result[1])))
+                    passed = False
+            if pvs[2] > plain[2]:
+                flags.append('NODES %+.1f%%' % ((pvs[2] / plain[2] - 1) * 100))
+                passed = False
+            total[0] += plain[2]
+            total[1] += pvs[2]
+            lines.append('%-20s d%d  alpha-beta %7d nodes  pvs %7d nodes  score %7d  move %-8s %s' % (
+                position['name'], depth, plain[2], pvs[2], plain[0], tuple(plain[1]), ' '.join(flags)))
+    lines.append('total alpha-beta %d nodes, pvs %d nodes (%.2fx)' % (total[0], total[1], total[1] / total[0] if total[0] > 0 else 0))
+    return lines, passed
+def compareResults(old, new, tolerance=0.1, time_tolerance=0.25):
+    #compareResults函数：和之前的结果比较，返回 (报告的每一行, 是否有退化)。
+    # 节点数增加超过 tolerance、用时增加超过 time_tolerance、或原来解对的战术局面走错都算退化；着法变化只提示。
+    old_results = {(r['name'], r['depth']): r for r in old['results']}
+    lines = []
+    regressed = False
+    for r in new['results']:
+        key = (r['name'], r['depth'])
+        if key not in old_results:
+            lines.append('%-20s d%d  new' % key)
+            continue
+        o = old_results[key]
+        node_ratio = r['nodes'] / o['nodes'] if o['nodes'] > 0 else 1.0
+        time_ratio = r['time'] / o['time'] if o['time'] > 0 else 1.0
+        flags = []
+        if node_ratio > 1 + tolerance:
+            flags.append('NODES')
+        if time_ratio > 1 + time_tolerance:
+            flags.append('TIME')
+        if (o.get('ok') and not r.get('ok')) or (o.get('threat_ok') and not r.get('threat_ok')):
+            flags.append('WRONG')
+        if r['move'] != o['move']:
+            flags.append('move %s->%s' % (tuple(o['move']), tuple(r['move'])))
+        if 'NODES' in flags or 'TIME' in flags or 'WRONG' in flags:
+            regressed = True
+        lines.append('%-20s d%d  nodes %7d -> %7d (%+.1f%%)  time %.3f -> %.3f (%+.1f%%)  %s' % (
+            r['name'], r['depth'], o['nodes'], r['nodes'], (node_ratio - 1) * 100,
+            o['time'], r['time'], (time_ratio - 1) * 100, ' '.join(flags)))
+    return lines, regressed
+def main():
+    parser = argparse.ArgumentParser(description='五子棋 AI 基准测试')
+    parser.add_argument('--depths', default=None, help='覆盖局面自带的搜索深度，例如 3,5')
+    parser.add_argument('--filter', default=None, help='只跑名字包含该字符串的局面')
+    parser.add_argument('--repeat', type=int, default=3, help='每个局面重复次数，取最短用时')
+    parser.add_argument('--output', default=None, help='把结果以 JSON 写入文件')
+    parser.add_argument('--stats', action='store_true', help='记录每层节点数、剪枝率和各函数用时')
+    parser.add_argument('--size', type=int, default=CHESS_LEN, help='棋盘大小（不小于 15），基准局面平移到棋盘中间')
+    parser.add_argument('--rule', choices=RULES, default=RULE, help='freestyle 长连也算胜，standard 只有正好五连算胜')
+    parser.add_argument('--selective', action='store_true', help='打开 LMR 和无用剪枝，靠后的平静着法不再搜索到完整深度')
+    parser.add_argument('--compare', default=None, help='和之前保存的 JSON 结果比较，有退化时返回 1')
+    parser.add_argument('--reach', default=None, help='例如 5,7：关掉选择性搜索按前一个深度、打开时按后一个深度搜索，'
+                        '用时超过原来或战术局面走错时返回 1')
+    parser.add_argument('--check-pvs', action='store_true', help='关掉主要变例搜索和渴望窗口各搜索一遍，分数或着法不同、'
+                        '或者有局面打开后节点数增加时返回 1')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='节点数允许增加的比例')
+    parser.add_argument('--time-tolerance', type=float, default=0.25, help='用时允许增加的比例')
+    args = parser.parse_args()
+    if args.size < POSITION_SIZE:
+        parser.error('--size must be at least %d' % POSITION_SIZE)
+    depths = [int(d) for d in args.depths.split(',')] if args.depths else None
+    positions = [p for p in POSITIONS if args.filter is None or args.filter in p['name']]
+    if args.reach:
+        base_depth, deep_depth = [int(d) for d in args.reach.split(',')]
+        lines, passed = compareReach(positions, base_depth, deep_depth, args.repeat, args.size, args.rule)
+        for line in lines:
+            print(line)
+        sys.exit(0 if passed else 1)
+    if args.check_pvs:
+        lines, passed = comparePVS(positions, depths, args.size, args.rule)
+        for line in lines:
+            print(line)
+        sys.exit(0 if passed else 1)
+    result = runBenchmark(positions, depths, args.repeat, args.size, args.stats, args.rule, args.selective)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=1)
+    for r in result['results']:
+        ok = '' if 'ok' not in r else ('ok' if r['ok'] else 'WRONG')
+        print('%-20s d%d  nodes %7d  time %7.3f  nps %8.0f  move %-8s score %7d %s' % (
+            r['name'], r['depth'], r['nodes'], r['time'], r['nps'], tuple(r['move']), r['score'], ok))
+        if 'threat_move' in r:
+            print('    threat search move %s  nodes %d  time %.3f %s' % (
+                r['threat_move'] and tuple(r['threat_move']), r['threat_nodes'], r['threat_time'],
+                'ok' if r['threat_ok'] else 'WRONG'))
+        if 'stats' in r:
+            print('    nodes/ply %s  cutoffs/ply %s  first cutoff rate %.3f' % (
+                r['stats']['nodes'], r['stats']['cutoffs'], r['stats']['first_cutoff_rate']))
+            print('    reductions %d  re-searches %d  futility prunes %d' % (
+                r['stats']['reductions'], r['stats']['re_searches'], r['stats']['futility_prunes']))
+            cache = r['stats']['point_cache']
+            print('    point cache hits %d  misses %d  evictions %d  hit rate %.3f' % (
+                cache['hits'], cache['misses'], cache['evictions'], cache['hit_rate']))
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        lines, regressed = compareResults(old, result, args.tolerance, args.time_tolerance)
+        print()
+        for line in lines:
+            print(line)
+        if regressed:
+            sys.exit(1)
+if __name__ == '__main__':
+    main()
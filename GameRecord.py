@@ -0,0 +1,244 @@
+#对局记录文件：每盘棋一条记录，只在文件末尾追加，着法按格子编号打包成字节；读取时逐条流式读出，不会把整个文件读进内存。
+#用法: python GameRecord.py convert games.jsonl --output games.gbr      （SelfPlay.py 的 JSON 对局记录和 .gbr 互相转换）
+#      python GameRecord.py filter games.gbr --output win.gbr --winner 1 --min-moves 20
+#      python GameRecord.py analyze games.gbr --depth 3 --workers 4 --output analysis.jsonl
+#文件格式（小端）: 文件头 magic 'GBGR', 版本 u16, 已经写完的记录结束的位置 u64；之后每盘棋一条记录:
+#  棋盘大小 u8, 规则（RULES 中的序号）u8, 胜方（0 表示和棋或没下完）u8, 着法数 u16,
+#  着法的格子编号 y * 棋盘大小 + x，格子数不超过 256 时每步 u8，否则每步 u16
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import struct
+import sys
+import time
+from Analysis import analyzeBoard
+from MaxMin_AlphaBeta import *
+
+RECORD_MAGIC = b'GBGR'
+RECORD_VERSION = 2  #版本 2 在文件头里记录已经写完的长度，追加时不用扫描整个文件
+RECORD_EXT = '.gbr'
+FILE_HEADER = struct.Struct('<4sHQ')
+GAME_HEADER = struct.Struct('<BBBH')
+ANALYZE_BATCH = 64 #analyze 每次交给进程池的对局数，限制同时在内存里的对局
+
+def cellFormat(chess_len, num): #cellFormat函数：num 个着法的 struct 格式。
+    return '<%d%s' % (num, 'B' if chess_len * chess_len <= 256 else 'H')
+def packGame(game): #packGame函数：把一盘棋 {'size', 'rule', 'winner', 'steps'} 打包成一条记录。
+    chess_len = game['size']
+    steps = game['steps']
+    cells = [y * chess_len + x for x, y in steps]
+    return (GAME_HEADER.pack(chess_len, RULES.index(game.get('rule', RULE)), game['winner'], len(steps)) +
+            struct.pack(cellFormat(chess_len, len(cells)), *cells))
+def checkHeader(f, path): #checkHeader函数：读取并检查文件头，返回已经写完的记录结束的位置。
+    data = f.read(FILE_HEADER.size)
+    if len(data) < FILE_HEADER.size:
+        raise ValueError('%s is not a game record file' % path)
+    magic, version, end = FILE_HEADER.unpack(data)
+    if magic != RECORD_MAGIC or version != RECORD_VERSION:
+        raise ValueError('%s is not a game record file' % path)
+    if end < FILE_HEADER.size or end > os.fstat(f.fileno()).st_size:
+        raise ValueError('%s is truncated' % path)
+    return end
+
+class GameWriter():
+    #GameWriter类：往对局记录文件末尾追加对局，文件不存在时先写文件头。
+    # 每写完一条记录才更新文件头里的长度；上次写入时程序中断留下的半条记录在长度之外，打开时截掉，不用扫描整个文件。
+    def __init__(self, path):
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.file = open(path, 'r+b')
+            try:
+                self.end = checkHeader(self.file, path)
+            except ValueError:
+                self.file.close()
+                raise
+            self.file.truncate(self.end)
+        else:
+            self.file = open(path, 'wb')
+            self.end = FILE_HEADER.size
+            self.file.write(FILE_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, self.end))
+        self.file.seek(self.end)
+        self.count = 0
+    def write(self, game):
+        data = packGame(game)
+        self.file.write(data)
+        self.end += len(data)
+        self.file.seek(0) #记录写完后再更新长度
+        self.file.write(FILE_HEADER.pack(RECORD_MAGIC, RECORD_VERSION, self.end))
+        self.file.seek(self.end)
+        self.count += 1
+    def close(self):
+        self.file.close()
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+
+def appendGames(path, games): #appendGames函数：把 games 追加到文件，返回写入的对局数。
+    with GameWriter(path) as writer:
+        for game in games:
+            writer.write(game)
+        return writer.count
+def readRecords(path):
+    #readRecords函数：逐条读出对局，每次产生一个 {'size', 'rule', 'winner', 'steps'}。
+    # 只读文件头里记录的长度之内的对局，之后没有写完的记录不读；记录和长度对不上时抛出 ValueError，之前的对局照常读出。
+    with open(path, 'rb') as f:
+        end = checkHeader(f, path)
+        while True:
+            if f.tell() >= end:
+                return
+            data = f.read(GAME_HEADER.size)
+            if len(data) < GAME_HEADER.size:
+                raise ValueError('%s is truncated' % path)
+            chess_len, rule, winner, num = GAME_HEADER.unpack(data)
+            fmt = cellFormat(chess_len, num)
+            data = f.read(struct.calcsize(fmt))
+            if len(data) < struct.calcsize(fmt) or f.tell() > end:
+                raise ValueError('%s is truncated' % path)
+            steps = [(cell % chess_len, cell // chess_len) for cell in struct.unpack(fmt, data)]
+            yield {'size': chess_len, 'rule': RULES[rule], 'winner': winner, 'steps': steps}
+def readGames(path): #readGames函数：按扩展名读 .gbr 或者每行一盘 JSON 的对局记录。
+    if path.endswith(RECORD_EXT):
+        yield from readRecords(path)
+        return
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                game = json.loads(line)
+                game['steps'] = [tuple(step) for step in game['steps']]
+                game.setdefault('rule', RULE)
+                yield game
+def replayGame(game, plies=None):
+    #replayGame函数：按顺序摆出对局中每一步之前的局面，产生 (着法序号, 棋盘, 轮到走的一方, 实际下的着法)。
+    # 每次产生的是同一个棋盘对象，下一次产生前会被改动，需要保留时自己复制。
+    chess_len = game['size']
+    board = [[0 for x in range(chess_len)] for y in range(chess_len)]
+    for ply, (x, y) in enumerate(game['steps'][:plies]):
+        turn = MAP_ENTRY_TYPE.MAP_PLAYER_ONE if ply % 2 == 0 else MAP_ENTRY_TYPE.MAP_PLAYER_TWO
+        yield ply, board, turn, (x, y)
+        board[y][x] = turn.value
+def matchGame(game, size=None, rule=None, winner=None, min_moves=0, max_moves=None): #matchGame函数：对局是否满足过滤条件。
+    num = len(game['steps'])
+    return ((size is None or game['size'] == size) and (rule is None or game['rule'] == rule) and
+            (winner is None or game['winner'] == winner) and num >= min_moves and (max_moves is None or num <= max_moves))
+
+record_ais = {} #每个进程里按 (棋盘大小, 规则) 缓存的 ChessAI
+def getAI(chess_len, rule): #getAI函数：取当前进程里某个棋盘大小和规则的 ChessAI，同样的只生成一次。
+    ai = record_ais.get((chess_len, rule))
+    if ai is None:
+        ai = ChessAI(chess_len, rule=rule)
+        record_ais[(chess_len, rule)] = ai
+    return ai
+def evaluateGame(ai, game, plies=None):
+    #evaluateGame函数：按顺序落子，产生 (着法序号, 实际下的着法, 落子前轮到走的一方的静态评分)。
+    # 用 makeMove 增量更新棋型统计，每步只重新分析经过落子点的四条线，比每个局面调用一次 evaluate 快。
+    chess_len = game['size']
+    ai.setBoard([[0 for x in range(chess_len)] for y in range(chess_len)])
+    for ply, (x, y) in enumerate(game['steps'][:plies]):
+        turn = MAP_ENTRY_TYPE.MAP_PLAYER_ONE if ply % 2 == 0 else MAP_ENTRY_TYPE.MAP_PLAYER_TWO
+        yield ply, (x, y), ai.evaluateIncremental(turn)
+        ai.makeMove(x, y, turn.value)
+def analyzeGame(task):
+    #analyzeGame函数：分析一盘棋的每个局面，返回 {'index', 'size', 'winner', 'positions'}。
+    # depth 和 time_limit 都为 None 时只算静态评分，否则每个局面再按 depth 和 time_limit 搜索，
+    # 记录搜索的着法和实际的着法是否相同。time_limit 的含义同 findBestChess，给出时按迭代加深搜索。
+    index, game, depth, time_limit, plies = task
+    ai = getAI(game['size'], game.get('rule', RULE))
+    positions = []
+    if depth is None and time_limit is None:
+        for ply, played, score in evaluateGame(ai, game, plies):
+            positions.append({'ply': ply, 'played': played, 'eval': score})
+    else:
+        for ply, board, turn, played in replayGame(game, plies):
+            result = {'ply': ply, 'played': played, 'eval': ai.evaluate(board, turn)}
+            result.update(analyzeBoard(ai, board, turn, SEARCH_DEPTH if depth is None else depth, time_limit))
+            result['agree'] = result['move'] == played
+            positions.append(result)
+    return {'index': index, 'size': game['size'], 'winner': game['winner'], 'positions': positions}
+def analyzeGames(games, depth=None, time_limit=None, plies=None, workers=1):
+    #analyzeGames函数：逐盘分析 games（可以是 readGames 返回的生成器），按输入顺序产生 analyzeGame 的结果。
+    # workers 大于 1 时用进程池，每次只取 ANALYZE_BATCH 盘棋交给进程池，不会把整个文件读进内存。
+    tasks = ((index, game, depth, time_limit, plies) for index, game in enumerate(games))
+    if workers <= 1:
+        yield from map(analyzeGame, tasks)
+        return
+    pool = multiprocessing.Pool(workers)
+    try:
+        while True:
+            batch = list(itertools.islice(tasks, ANALYZE_BATCH))
+            if not batch:
+                break
+            yield from pool.imap(analyzeGame, batch)
+    finally:
+        pool.close()
+        pool.join()
+
+def convert(args):
+    if args.output.endswith(RECORD_EXT):
+        count = appendGames(args.output, readGames(args.input))
+    else:
+        count = 0
+        with open(args.output, 'a') as out:
+            for game in readGames(args.input):
+                out.write(json.dumps(game) + '\n')
+                count += 1
+    print('%d 盘棋写入 %s' % (count, args.output))
+def filterGames(args):
+    games = (game for game in readGames(args.input)
+             if matchGame(game, args.size, args.rule, args.winner, args.min_moves, args.max_moves))
+    count = appendGames(args.output, itertools.islice(games, args.limit))
+    print('%d 盘棋写入 %s' % (count, args.output))
+def analyze(args):
+    start = time.time()
+    games = itertools.islice(readGames(args.input), args.limit)
+    out = open(args.output, 'w') if args.output else None
+    count = positions = agree = 0
+    try:
+        for result in analyzeGames(games, args.depth, args.time_limit, args.plies, args.workers):
+            count += 1
+            positions += len(result['positions'])
+            agree += sum(1 for p in result['positions'] if p.get('agree'))
+            if out is not None:
+                out.write(json.dumps(result) + '\n')
+    finally:
+        if out is not None:
+            out.close()
+    elapsed = time.time() - start
+    print('分析 %d 盘棋，%d 个局面，用时 %.2f 秒，%.1f 局面/秒' % (count, positions, elapsed, positions / elapsed if elapsed > 0 else 0))
+    if (args.depth is not None or args.time_limit is not None) and positions > 0:
+        print('搜索的着法和实际着法相同的比例 %.3f' % (agree / positions))
+def main():
+    parser = argparse.ArgumentParser(description='对局记录的转换、过滤和批量分析')
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('convert', help='.gbr 和每行一盘 JSON 的对局记录互相转换，按输出文件的扩展名决定格式')
+    command.add_argument('input', help='输入文件')
+    command.add_argument('--output', required=True, help='输出文件，已存在时追加')
+    command.set_defaults(run=convert)
+    command = commands.add_parser('filter', help='挑出满足条件的对局')
+    command.add_argument('input', help='输入文件')
+    command.add_argument('--output', required=True, help='输出的 .gbr 文件，已存在时追加')
+    command.add_argument('--size', type=int, default=None, help='棋盘大小')
+    command.add_argument('--rule', choices=RULES, default=None, help='规则')
+    command.add_argument('--winner', type=int, choices=(0, 1, 2), default=None, help='胜方，0 表示和棋')
+    command.add_argument('--min-moves', type=int, default=0, help='最少步数')
+    command.add_argument('--max-moves', type=int, default=None, help='最多步数')
+    command.add_argument('--limit', type=int, default=None, help='最多输出的对局数')
+    command.set_defaults(run=filterGames)
+    command = commands.add_parser('analyze', help='重放对局，计算每个局面的静态评分，指定 --depth 或 --time-limit 时再搜索')
+    command.add_argument('input', help='输入文件')
+    command.add_argument('--depth', type=int, default=None, help='搜索深度，不指定时只算静态评分')
+    command.add_argument('--time-limit', type=float, default=None, help='每个局面限时（秒），设置后按迭代加深搜索')
+    command.add_argument('--plies', type=int, default=None, help='每盘棋只分析前多少步')
+    command.add_argument('--limit', type=int, default=None, help='最多分析的对局数')
+    command.add_argument('--workers', type=int, default=1, help='进程数')
+    command.add_argument('--output', default=None, help='把每盘棋的分析结果按一行 JSON 写入文件')
+    command.set_defaults(run=analyze)
+    args = parser.parse_args()
+    try:
+        args.run(args)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,23 @@
+import argparse
+import os
 import pygame
+from concurrent.futures import ThreadPoolExecutor
 from enum import IntEnum
 from pygame.locals import *
+from GameRecord import appendGames
 from MaxMin_AlphaBeta import *
 
+def parseArgs():#命令行参数：python GoBang.py --size 19 --rule standard
+    parser = argparse.ArgumentParser(description='五子棋')
+    parser.add_argument('--size', type=int, default=CHESS_LEN, help='棋盘大小')
+    parser.add_argument('--rule', choices=RULES, default=RULE, help='freestyle 长连也算胜，standard 只有正好五连算胜')
+    parser.add_argument('--no-ponder', dest='ponder', action='store_false', help='玩家思考时 AI 不在后台搜索')
+    return parser.parse_args()
+ARGS = parseArgs()
 #定义游戏棋盘的参数
-REC_SIZE = 50#棋子移动空间的大小
+CHESS_LEN = ARGS.size#棋盘大小
+REC_SIZE = min(50, 750 // CHESS_LEN)#棋子移动空间的大小，棋盘大时缩小格子，窗口高度不超过 750
 CHESS_RADIUS = REC_SIZE // 2 - 2
-CHESS_LEN = 15#棋子长度
 MAP_WIDTH = CHESS_LEN * REC_SIZE#地图宽度
 MAP_HEIGHT = CHESS_LEN * REC_SIZE#地图高度
 INFO_WIDTH = 200#信息宽度
@@ -14,8 +25,19 @@ BUTTON_WIDTH = 140#按钮宽度
 BUTTON_HEIGHT = 50#按钮高度
 SCREEN_WIDTH = MAP_WIDTH + INFO_WIDTH#屏幕宽度
 SCREEN_HEIGHT = MAP_HEIGHT#屏幕高度
-SEARCH_DEPTH = 5       #搜索深度5
-LIMITED_MOVE_NUM = 10   #限制步数10
+BOOK_FILE = "book.bin"  #开局库文件，用 OpeningBook.py 生成，文件不存在时不用开局库
+GAME_FILE = "games.gbr"  #每盘棋结束后追加到这个对局记录文件，格式见 GameRecord.py
+PLAYER_COLOR = [(255, 251, 240), (10, 10, 10)]#双方棋子的颜色rgb
+CURSOR_COLOR = (21, 174, 103)
+LAST_MOVE_COLOR = (0, 0, 255)
+def starPoints(size):#starPoints函数：棋盘上星位的坐标，15x15 是四个角上的 (3, 3) 和天元，19x19 再加上四条边中间的星位
+    corner = 3 if size >= 13 else 2
+    far = size - 1 - corner
+    center = size // 2
+    points = [(corner, corner), (far, corner), (corner, far), (far, far), (center, center)]
+    if size >= 19:
+        points += [(center, corner), (corner, center), (far, center), (center, far)]
+    return points
 #地图类
 class Map():
     #初始化，设置
@@ -59,35 +81,6 @@ class Map():
     def click(self, x, y, type):
         self.map[y][x] = type.value
         self.steps.append((x, y))
-    #画出棋子
-    def drawChess(self, screen):
-        player_one = (255, 251, 240)#颜色rgb
-        player_two = (10, 10, 10)
-        player_color = [player_one, player_two]
-
-        font = pygame.font.SysFont('simsunnsimsun', REC_SIZE * 2 // 3)#棋盘表面
-        for i in range(len(self.steps)):
-            x, y = self.steps[i]#步长
-            map_x, map_y, width, height = self.getMapUnitRect(x, y)#棋盘上能下棋的位置
-            pos, radius = (map_x + width // 2, map_y + height // 2), CHESS_RADIUS#棋子半径
-            turn = self.map[y][x]#转换
-            if turn == 1:
-                op_turn = 2
-            else:
-                op_turn = 1
-            pygame.draw.circle(screen, player_color[turn - 1], pos, radius)#画出圈
-            msg_image = font.render(str(i), True, player_color[op_turn - 1], player_color[turn - 1])#双方的棋子
-            msg_image_rect = msg_image.get_rect()#棋子反应
-            msg_image_rect.center = pos#棋子中心
-            screen.blit(msg_image, msg_image_rect)#屏幕刷新
-
-        if len(self.steps) > 0:
-            last_pos = self.steps[-1]
-            map_x, map_y, width, height = self.getMapUnitRect(last_pos[0], last_pos[1])
-            purple_color = (0, 0, 255)
-            point_list = [(map_x, map_y), (map_x + width, map_y),
-                          (map_x + width, map_y + height), (map_x, map_y + height)]
-            pygame.draw.lines(screen, purple_color, True, point_list, 1)
     #绘制棋盘
     def drawBackground(self, screen):
         color = (0, 0, 0)
@@ -110,7 +103,7 @@ class Map():
                 width = 1
             pygame.draw.line(screen, color, start_pos, end_pos, width)
         rec_size = 8
-        pos = [(3, 3), (11, 3), (3, 11), (11, 11), (7, 7)]
+        pos = starPoints(self.width)
         for (x, y) in pos:
             pygame.draw.rect(screen, color, (
             REC_SIZE // 2 + x * REC_SIZE - rec_size // 2, REC_SIZE // 2 + y * REC_SIZE - rec_size // 2, rec_size,
@@ -165,9 +158,11 @@ class GiveupButton(Button):
         super().__init__(screen, text, x, y, [(254,67,101), (252,157,154)], False)
     def click(self, game):
         if self.enable:
+            game.ai_thread.cancel()
             game.is_play = False
             if game.winner is None:
                 game.winner = game.map.reverseTurn(game.player)
+            game.saveGame()
             self.msg_image = self.font.render(self.text, True, self.text_color, self.button_color[1])
             self.enable = False
             return True
@@ -177,6 +172,179 @@ class GiveupButton(Button):
         if not self.enable:
             self.msg_image = self.font.render(self.text, True, self.text_color, self.button_color[0])
             self.enable = True
+#AIThread类：在后台线程里运行 AI 搜索，主循环继续刷新界面和处理事件，用 poll 取搜索结果。
+#后台思考（ponder）：AI 落子后，先预测玩家的应手，再按预测的应手提前搜索 AI 的下一步。
+#玩家真的下在预测的位置时直接用这个搜索（可能已经有结果），否则中断它重新搜索，置换表和历史得分已经预热过。
+class AIThread():
+    def __init__(self, ai, ponder=True):
+        self.ai = ai
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+        self.use_ponder = ponder
+        self.ponder_future = None
+        self.ponder_move = None#预测的玩家应手，在工作线程里预测完成后设置
+        self.ponder_hits = self.ponder_misses = 0
+    def busy(self):
+        return self.future is not None
+    def start(self, board, turn, last_move=None):#last_move 是对方刚下的一步，和预测的应手相同时直接用后台思考的搜索
+        if self.ponder_future is not None:
+            if last_move is not None and self.ponder_move == last_move:
+                self.ponder_hits += 1
+                self.future, self.ponder_future = self.ponder_future, None
+                return
+            self.ponder_misses += 1
+            self.cancelPonder()
+        board = [list(row) for row in board]#复制棋盘，搜索时不会改动界面上的棋盘
+        self.future = self.executor.submit(self.run, board, turn)
+    def run(self, board, turn):
+        # 在工作线程中开始搜索时才清除中断标志：上一次被取消的搜索这时已经结束，不会被重新放行
+        self.ai.stopped = False
+        return self.ai.findBestChess(board, turn)
+    def ponder(self, board, turn):#AI 落子后调用，turn 是玩家一方，在玩家思考时后台搜索
+        if not self.use_ponder or self.future is not None:
+            return
+        board = [list(row) for row in board]
+        self.ponder_move = None
+        self.ponder_future = self.executor.submit(self.runPonder, board, turn)
+    def runPonder(self, board, turn):
+        self.ai.stopped = False
+        x, y = self.ai.predictMove(board, turn)
+        self.ponder_move = (x, y)
+        board[y][x] = turn.value
+        if self.ai.isWinMove(board, x, y):#预测玩家能连成五，不用再搜索 AI 的应手
+            return None
+        if turn == MAP_ENTRY_TYPE.MAP_PLAYER_ONE:
+            return self.ai.findBestChess(board, MAP_ENTRY_TYPE.MAP_PLAYER_TWO)
+        return self.ai.findBestChess(board, MAP_ENTRY_TYPE.MAP_PLAYER_ONE)
+    def cancelPonder(self):
+        if self.ponder_future is not None:
+            self.ponder_future.cancel()
+            self.ai.stop()
+            self.ponder_future = None
+            self.ponder_move = None
+    def poll(self):#搜索完成时返回着法，否则返回 None
+        if self.future is None or not self.future.done():
+            return None
+        future, self.future = self.future, None
+        return future.result()
+    def cancel(self):#放弃当前搜索：还没开始的直接取消，正在进行的让 AI 尽快中断，结果丢弃
+        self.cancelPonder()
+        if self.future is not None:
+            self.future.cancel()
+            self.ai.stop()
+            self.future = None
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=True)
+#Renderer类：缓存界面的绘制。图片只加载一次，背景和棋盘网格预先合成一张静态画面，每颗棋子（颜色和序号）的图像画一次后缓存，
+#每帧只重画有变化的区域，draw 返回这些区域交给 pygame.display.update。
+class Renderer():
+    def __init__(self, screen, map):
+        self.screen = screen
+        self.map = map
+        self.grid = pygame.Surface((MAP_WIDTH, MAP_HEIGHT), pygame.SRCALPHA)#透明底的棋盘网格，画鼠标光标后盖在上面
+        map.drawBackground(self.grid)
+        self.static = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()#背景图加网格
+        #背景图按 15x15 的窗口大小画的，其他棋盘大小时缩放到窗口大小
+        self.static.blit(pygame.transform.smoothscale(pygame.image.load("bgmain.jpg").convert(), (MAP_WIDTH, MAP_HEIGHT)), (0, 0))
+        self.static.blit(pygame.transform.smoothscale(pygame.image.load("bgbian.jpg").convert(), (INFO_WIDTH, SCREEN_HEIGHT)), (MAP_WIDTH, 0))
+        self.static.blit(self.grid, (0, 0))
+        self.win_images = [pygame.image.load("manwin.jpg").convert(), pygame.image.load("comwin.jpg").convert()]
+        self.font = pygame.font.SysFont('simsunnsimsun', REC_SIZE * 2 // 3)
+        self.glyphs = {}#(棋子颜色, 序号) -> 棋子图像
+        self.order = {}#(x, y) -> 这颗棋子的序号
+        self.full = True#下一帧整屏重画
+        self.drawn = 0#已经画上的棋子数
+        self.winner = None
+        self.button_images = None
+        self.cursor_rect = None
+    #stoneGlyph函数：取某颜色、某序号的棋子图像，第一次用到时才渲染
+    def stoneGlyph(self, turn, index):
+        key = (turn, index)
+        glyph = self.glyphs.get(key)
+        if glyph is None:
+            glyph = pygame.Surface((REC_SIZE, REC_SIZE), pygame.SRCALPHA)
+            center = (REC_SIZE // 2, REC_SIZE // 2)
+            pygame.draw.circle(glyph, PLAYER_COLOR[turn - 1], center, CHESS_RADIUS)
+            msg_image = self.font.render(str(index), True, PLAYER_COLOR[2 - turn], PLAYER_COLOR[turn - 1])
+            msg_image_rect = msg_image.get_rect()
+            msg_image_rect.center = center
+            glyph.blit(msg_image, msg_image_rect)
+            self.glyphs[key] = glyph
+        return glyph
+    #cellRect函数：一个格子的区域，多出的一个像素是最后一步方框的右边和下边
+    def cellRect(self, x, y):
+        return pygame.Rect(x * REC_SIZE, y * REC_SIZE, REC_SIZE + 1, REC_SIZE + 1)
+    #drawStones函数：只在 rect 区域内画出和它相交的格子上的棋子以及最后一步的方框
+    def drawStones(self, rect):
+        steps = self.map.steps
+        self.screen.set_clip(rect)
+        for y in range(max(0, rect.top // REC_SIZE), min(CHESS_LEN, (rect.bottom - 1) // REC_SIZE + 1)):
+            for x in range(max(0, rect.left // REC_SIZE), min(CHESS_LEN, (rect.right - 1) // REC_SIZE + 1)):
+                index = self.order.get((x, y))
+                if index is not None:
+                    self.screen.blit(self.stoneGlyph(self.map.map[y][x], index), (x * REC_SIZE, y * REC_SIZE))
+        if len(steps) > 0:
+            last_rect = self.cellRect(steps[-1][0], steps[-1][1])
+            if last_rect.colliderect(rect):
+                pygame.draw.rect(self.screen, LAST_MOVE_COLOR, last_rect, 1)
+        self.screen.set_clip(None)
+    #restore函数：用静态画面和棋子把 rect 区域恢复原样
+    def restore(self, rect):
+        self.screen.blit(self.static, rect, rect)
+        self.drawStones(rect)
+    #drawCursor函数：在 pos 处画出跟随鼠标的棋子，网格和旁边的棋子仍然盖在它上面，返回画过的区域
+    # 光标只画在棋盘内，伸到右边信息栏的部分不画，否则刷新时恢复不了，会留下痕迹
+    def drawCursor(self, pos):
+        map_rect = pygame.Rect(0, 0, MAP_WIDTH, MAP_HEIGHT)
+        self.screen.set_clip(map_rect)
+        rect = pygame.draw.circle(self.screen, CURSOR_COLOR, pos, CHESS_RADIUS).clip(map_rect)
+        self.screen.set_clip(None)
+        self.screen.blit(self.grid, rect, rect)
+        self.drawStones(rect)
+        return rect
+    #draw函数：画出这一帧，cursor 是鼠标光标棋子的位置（不显示时为 None），返回需要刷新的区域
+    def draw(self, game, cursor):
+        steps = self.map.steps
+        button_images = [button.msg_image for button in game.buttons]
+        if self.full or len(steps) < self.drawn or game.winner != self.winner:
+            # 新开一局、分出胜负等大的变化直接整屏重画
+            self.order = {step: i for i, step in enumerate(steps)}
+            self.screen.blit(self.static, (0, 0))
+            for button in game.buttons:
+                button.draw()
+            if game.winner is not None:
+                self.screen.blit(self.win_images[game.winner - 1], (MAP_WIDTH + 25, SCREEN_HEIGHT-200))
+            self.drawStones(self.screen.get_rect())
+            self.cursor_rect = self.drawCursor(cursor) if cursor is not None else None
+            self.full = False
+            self.drawn = len(steps)
+            self.winner = game.winner
+            self.button_images = button_images
+            return [self.screen.get_rect()]
+        dirty = []
+        if self.cursor_rect is not None:
+            self.restore(self.cursor_rect)
+            dirty.append(self.cursor_rect)
+            self.cursor_rect = None
+        if len(steps) > self.drawn:
+            cells = [steps[i] for i in range(max(0, self.drawn - 1), len(steps))]#上一个最后一步要去掉方框
+            for i in range(self.drawn, len(steps)):
+                self.order[steps[i]] = i
+            for x, y in cells:
+                rect = self.cellRect(x, y)
+                self.restore(rect)
+                dirty.append(rect)
+            self.drawn = len(steps)
+        if button_images != self.button_images:
+            for button in game.buttons:
+                button.draw()
+                dirty.append(button.rect)
+            self.button_images = button_images
+        if cursor is not None:
+            self.cursor_rect = self.drawCursor(cursor)
+            dirty.append(self.cursor_rect)
+        return dirty
 #初始化棋盘及相关参数
 class Game():
     def __init__(self, caption):
@@ -189,52 +357,59 @@ class Game():
         self.buttons.append(GiveupButton(self.screen, '发起投降', MAP_WIDTH + 30, BUTTON_HEIGHT + 45))
         self.is_play = False
         self.map = Map(CHESS_LEN, CHESS_LEN)
+        self.renderer = Renderer(self.screen, self.map)
         self.player = MAP_ENTRY_TYPE.MAP_PLAYER_ONE
         self.action = None
-        self.AI = ChessAI(CHESS_LEN)
+        self.AI = ChessAI(CHESS_LEN, rule=ARGS.rule)
+        if os.path.exists(BOOK_FILE):
+            try:
+                self.AI.loadBook(BOOK_FILE)
+            except ValueError as e:
+                print('不使用开局库: %s' % e)
+        self.ai_thread = AIThread(self.AI, ARGS.ponder)
         self.useAI = False
         self.winner = None
     def start(self):
+        self.ai_thread.cancel()
+        self.useAI = False
+        self.action = None
         self.is_play = True
         self.player = MAP_ENTRY_TYPE.MAP_PLAYER_ONE
         self.map.reset()
+    #play函数：处理一帧，返回需要刷新的屏幕区域
     def play(self):
         self.clock.tick(60)
-        background23 = pygame.image.load("bgmain.jpg")
-        self.screen.blit(background23, (0, 0))
-        background22 = pygame.image.load("bgbian.jpg")
-        self.screen.blit(background22, (MAP_WIDTH, 0))
-        for button in self.buttons:
-            button.draw()
+        cursor = None
         if self.is_play and not self.isOver():
             if self.useAI:
-                x, y = self.AI.findBestChess(self.map.map, self.player)
-                self.checkClick(x, y, True)
+                self.ai_thread.start(self.map.map, self.player, self.map.steps[-1])#在后台搜索，界面不会卡住
                 self.useAI = False
+            move = self.ai_thread.poll()
+            if move is not None:
+                self.checkClick(move[0], move[1], True)
+                if not self.isOver():
+                    self.ai_thread.ponder(self.map.map, self.player)#玩家思考时后台搜索
             if self.action is not None:
                 self.checkClick(self.action[0], self.action[1])
                 self.action = None
             if not self.isOver():
-                self.changeMouseShow()
+                cursor = self.changeMouseShow()
         if self.isOver():
-            self.showWinner()
-        self.map.drawBackground(self.screen)
-        self.map.drawChess(self.screen)
-#修改鼠标显示
+            pygame.mouse.set_visible(True)
+        return self.renderer.draw(self, cursor)
+#修改鼠标显示，鼠标在空的格子上时隐藏鼠标，返回要画光标棋子的位置
     def changeMouseShow(self):
         map_x, map_y = pygame.mouse.get_pos()
         x, y = self.map.MapPosToIndex(map_x, map_y)
         if self.map.isInMap(map_x, map_y) and self.map.isEmpty(x, y):
             pygame.mouse.set_visible(False)
-            light_red = (21, 174, 103)
-            pos, radius = (map_x, map_y), CHESS_RADIUS
-            pygame.draw.circle(self.screen, light_red, pos, radius)
-        else:
-            pygame.mouse.set_visible(True)
+            return (map_x, map_y)
+        pygame.mouse.set_visible(True)
+        return None
 
     def checkClick(self, x, y, isAI=False):
         self.map.click(x, y, self.player)
-        if self.AI.isWin(self.map.map, self.player):
+        if self.AI.isWinMove(self.map.map, x, y):
             self.winner = self.player
             self.click_button(self.buttons[1])
         else:
@@ -243,22 +418,21 @@ class Game():
                 self.useAI = True
 #处理鼠标输入
     def mouseClick(self, map_x, map_y):
-        if self.is_play and self.map.isInMap(map_x, map_y) and not self.isOver():
+        if (self.is_play and self.map.isInMap(map_x, map_y) and not self.isOver()
+                and not self.ai_thread.busy()):#AI 思考时不能落子
             x, y = self.map.MapPosToIndex(map_x, map_y)
             if self.map.isEmpty(x, y):
                 self.action = (x, y)
     def isOver(self):
         return self.winner is not None
-    def showWinner(self):
-        def showPIC(screen):
-            if self.winner == MAP_ENTRY_TYPE.MAP_PLAYER_ONE:
-                background1 = pygame.image.load("manwin.jpg")
-                screen.blit(background1, (MAP_WIDTH + 25, SCREEN_HEIGHT-200))
-            else:
-                background2 = pygame.image.load("comwin.jpg")
-                screen.blit(background2, (MAP_WIDTH + 25, SCREEN_HEIGHT-200))
-        showPIC(self.screen)
-        pygame.mouse.set_visible(True)
+    def saveGame(self):#saveGame函数：把这盘棋追加到对局记录文件，保存失败不影响游戏
+        if not self.map.steps:
+            return
+        game = {'size': CHESS_LEN, 'rule': ARGS.rule, 'winner': self.winner.value, 'steps': self.map.steps}
+        try:
+            appendGames(GAME_FILE, [game])
+        except (OSError, ValueError) as e:
+            print('保存对局失败: %s' % e)
     def click_button(self, button):
         if button.click(self):
             for tmp in self.buttons:
@@ -272,10 +446,10 @@ class Game():
 #获取鼠标点击事件，判断是点击棋盘还是点击按钮。
 game = Game("五子棋")
 while True:
-    game.play()
-    pygame.display.update()
+    pygame.display.update(game.play())#只刷新有变化的区域
     for event in pygame.event.get():
         if event.type == pygame.QUIT:
+            game.ai_thread.shutdown()
             pygame.quit()
             exit()
         elif event.type == pygame.MOUSEBUTTONDOWN:
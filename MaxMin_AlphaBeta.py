@@ -1,6 +1,9 @@
+from collections import OrderedDict
 from enum import IntEnum
-from random import randint
+from random import randint, Random
+import multiprocessing
 import time
+from OpeningBook import OpeningBook
 
 class MAP_ENTRY_TYPE(IntEnum):
     MAP_EMPTY = 0,
@@ -25,14 +28,329 @@ SCORE_MAX = 0x7fffffff #最大得分
 SCORE_MIN = -1 * SCORE_MAX #最小得分
 SCORE_FIVE, SCORE_FOUR, SCORE_SFOUR = 100000, 10000, 1000
 SCORE_THREE, SCORE_STHREE, SCORE_TWO, SCORE_STWO = 100, 10, 8, 2
+CHESS_LEN = 15         #默认的棋盘大小
+RULE_FREESTYLE = 'freestyle' #无禁手规则：五连和长连（六个或更多）都算胜
+RULE_STANDARD = 'standard'   #标准规则：只有正好五连才算胜，长连不算
+RULES = (RULE_FREESTYLE, RULE_STANDARD)
+RULE = RULE_FREESTYLE  #默认规则
 SEARCH_DEPTH = 5       #搜索深度5
 LIMITED_MOVE_NUM = 10  #限制步数10
+DIR_OFFSET = [(1, 0), (0, 1), (1, 1), (1, -1)] #四个方向：横、竖、主对角线、副对角线
+SEARCH_TIME = None     #每步的时间限制（秒），None 表示按 SEARCH_DEPTH 固定深度搜索
+MAX_SEARCH_DEPTH = 20  #限时搜索时迭代加深的最大深度
+ASPIRATION_WINDOW = 200 #迭代加深时根节点的渴望窗口：预计分数上下各留这么多
+USE_PVS = True         #主要变例搜索：第一个着法之后的着法先用零窗口试探，关掉时是普通的 alpha-beta 搜索，结果相同
+PVS_DEPTH = 5          #剩余深度不小于这个值的节点才用零窗口试探，浅的子树试探省下的节点抵不上重新搜索；
+# 第一个着法不是最好的着法时，试探失败后的重新搜索比直接搜索还慢，Benchmark.py --check-pvs 里有几个局面节点数比 alpha-beta 多
+USE_LMR = False        #靠后的平静着法减少搜索深度（late move reduction），试探分数超过 alpha 时再按完整深度搜索；
+# 和 USE_FUTILITY 一样默认关闭：只有同时加深搜索才有意义，打开时按 Benchmark.py --reach 选择深度
+LMR_DEPTH = 3          #剩余深度不小于这个值的节点才减少深度
+LMR_REDUCTIONS = (0, 2) #LMR_REDUCTIONS[着法的序号] 是这个着法减少的深度，更靠后的着法按最后一项；
+# 评分偏向轮到走的一方，减少奇数层会让叶子换成另一方走，试探分数不准、重新搜索反而更多，所以减少两层
+USE_FUTILITY = False   #前沿节点静态评分加上余量仍不超过 alpha 时，不再搜索平静着法（futility pruning）
+FUTILITY_MARGIN = (0, 100, 200, 300) #FUTILITY_MARGIN[剩余深度] 是这一层一个平静着法最多能提高的评分，超出范围的深度不剪枝
+QUIET_SCORE = SCORE_SFOUR #位置得分低于这个值、并且不形成冲四或活四的着法是平静着法；单个冲四的位置得分只有 SCORE_THREE，要用 makesFour 另外判断
+PONDER_DEPTH = 3       #后台思考时，置换表里没有对方着法的话用这个深度搜索来预测
+SEARCH_WORKERS = 1     #根节点并行搜索的进程数，1 表示在当前进程里搜索
+USE_VCF = True         #findBestChess 搜索前先找连续冲四（VCF）必胜
+USE_VCT = False        #同时找冲四、活三组成的连续进攻（VCT）必胜，比 VCF 慢
+VCF_DEPTH = 15         #VCF 最多连续冲四的步数
+VCT_DEPTH = 7          #VCT 最多连续进攻的步数
+THREAT_NODE_LIMIT = 20000 #VCF/VCT 搜索的节点数上限
+THREAT_TIME_LIMIT = 1.0 #findBestChess 中 VCF/VCT 搜索的时间上限（秒）
+TT_SIZE = 1 << 18      #置换表条目数上限（每个条目约 100 字节，默认约 25MB）
+TT_EXACT, TT_LOWER, TT_UPPER = 0, 1, 2 #置换表中分数的类型：精确值、下界、上界
+LINE_PAD = 4 #每条线的位掩码两端各留 4 位表示棋盘外，以任意点为中心取 9 位窗口都不会越界
+WINDOW_MASK = (1 << 9) - 1
+def buildWindowLines(): #buildWindowLines函数：预先生成所有 9 位窗口对应的线（己方为 1，对方为 2，空为 0）。
+    # 下标是 (己方 9 位掩码 << 9) | 对方 9 位掩码，第 i 位对应 getLine 返回的 line[i]
+    window_lines = [None] * (1 << 18)
+    for code in range(3 ** 9):
+        line = []
+        mine_bits = opponent_bits = 0
+        for i in range(9):
+            chess = code % 3
+            code //= 3
+            line.append(chess)
+            if chess == 1:
+                mine_bits |= 1 << i
+            elif chess == 2:
+                opponent_bits |= 1 << i
+        window_lines[(mine_bits << 9) | opponent_bits] = tuple(line)
+    return window_lines
+WINDOW_LINES = buildWindowLines()
+FIVE_POINT_CACHE = {} #lineFivePoints 的结果缓存
+FIVE_POINT_CACHE_SIZE = 1 << 16
+POINT_CACHE_SIZE = 1 << 16 #PointCache 的条目数上限
+KEY_MASK = (1 << 11) - 1 #标准规则下 PointCache 的键取每条线上以该点为中心的 11 位，判断长连要比 9 位窗口多看两端各一位
+class SearchStats(): #SearchStats类：记录搜索过程的统计数据，由 ChessAI.enableStats 打开
+    def __init__(self):
+        self.reset()
+    def reset(self):
+        self.nodes = [] #nodes[ply] 第 ply 层（根节点为 0）访问的节点数
+        self.cutoffs = [] #cutoffs[ply] 第 ply 层发生 beta 剪枝的次数
+        self.first_cutoffs = [] #first_cutoffs[ply] 第 ply 层由第一个着法引起剪枝的次数
+        self.hash_hits = 0 #置换表直接返回结果的次数
+        self.reductions = 0 #减少深度搜索的着法数
+        self.re_searches = 0 #减少深度的试探超过 alpha、按完整深度重新搜索的着法数
+        self.futility_prunes = 0 #被无用剪枝跳过的着法数
+        self.calls = {} #函数名 -> 调用次数
+        self.times = {} #函数名 -> 累计用时（秒）
+        self.search_time = 0
+    def addNode(self, ply):
+        while len(self.nodes) <= ply:
+            self.nodes.append(0)
+            self.cutoffs.append(0)
+            self.first_cutoffs.append(0)
+        self.nodes[ply] += 1
+    def addCutoff(self, ply, first):
+        self.cutoffs[ply] += 1
+        if first:
+            self.first_cutoffs[ply] += 1
+    def addTime(self, name, elapsed):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.times[name] = self.times.get(name, 0) + elapsed
+    def firstCutoffRate(self): #firstCutoffRate函数：所有剪枝中由第一个着法引起的比例，越接近 1 说明着法排序越好。
+        cutoffs = sum(self.cutoffs)
+        return sum(self.first_cutoffs) / cutoffs if cutoffs > 0 else 0
+    def summary(self): #summary函数：以字典形式返回所有统计数据。
+        return {
+            'nodes': list(self.nodes),
+            'cutoffs': list(self.cutoffs),
+            'first_cutoffs': list(self.first_cutoffs),
+            'first_cutoff_rate': self.firstCutoffRate(),
+            'hash_hits': self.hash_hits,
+            'reductions': self.reductions,
+            're_searches': self.re_searches,
+            'futility_prunes': self.futility_prunes,
+            'calls': dict(self.calls),
+            'times': dict(self.times),
+            'search_time': self.search_time,
+        }
+    def __str__(self):
+        lines = ['ply    nodes  cutoffs  first']
+        for ply in range(len(self.nodes)):
+            lines.append('%3d %8d %8d %6d' % (ply, self.nodes[ply], self.cutoffs[ply], self.first_cutoffs[ply]))
+        lines.append('first move cutoff rate %.3f, hash hits %d' % (self.firstCutoffRate(), self.hash_hits))
+        lines.append('reductions %d, re-searches %d, futility prunes %d' % (self.reductions, self.re_searches, self.futility_prunes))
+        for name in sorted(self.times):
+            lines.append('%-12s calls %8d  time %.3fs' % (name, self.calls[name], self.times[name]))
+        lines.append('search time %.3fs' % self.search_time)
+        return '\n'.join(lines)
+class SearchTimeout(Exception): #限时搜索超过截止时间时在 __search 内部抛出，由 findBestChess 捕获
+    pass
+class PointCache(): #PointCache类：evaluatePointBits 的 LRU 缓存，最久没有用到的条目先被淘汰
+    # 位置得分只取决于经过该点的四条线上该点附近的棋子，键是这几段窗口的编码加上落子的一方，值是 (mscore, oscore)。
+    # 搜索中兄弟节点之间大部分窗口没有变化，撤销落子后附近的点又回到之前见过的窗口，所以命中率很高。
+    def __init__(self, size=POINT_CACHE_SIZE):
+        self.size = size
+        self.table = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    def get(self, key): #get函数：返回缓存的得分，没有时返回 None。
+        value = self.table.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.table.move_to_end(key)
+        return value
+    def put(self, key, value):
+        self.table[key] = value
+        if len(self.table) > self.size:
+            self.table.popitem(last=False)
+            self.evictions += 1
+    def clear(self):
+        self.table.clear()
+        self.hits = self.misses = self.evictions = 0
+    def hitRate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0
+    def summary(self): #summary函数：以字典形式返回命中、未命中和淘汰的次数。
+        return {
+            'size': self.size,
+            'entries': len(self.table),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hitRate(),
+        }
 class ChessAI():      #chessAI类
-    def __init__(self, chess_len):
+    def __init__(self, chess_len=CHESS_LEN, tt_size=TT_SIZE, workers=SEARCH_WORKERS, deterministic=False, rule=RULE):
+        if rule not in RULES:
+            raise ValueError('unknown rule %r' % rule)
         self.len = chess_len #棋盘长度
+        self.rule = rule
+        self.exact_five = rule == RULE_STANDARD #为 True 时长连不算五连
+        self.tt_size = tt_size
+        # workers > 1 时根节点的着法分给多个进程搜索；deterministic 为 True 时每个着法都用完整窗口搜索，
+        # 并且不做选择性搜索，结果和关掉 use_lmr、use_futility 的单进程搜索完全一致；
+        # 否则进程之间共享 alpha 下界，剪枝更多但同分着法的选择可能不同。
+        self.workers = workers
+        self.deterministic = deterministic
+        self.pool = None
+        self.shared_alpha = None
+        self.alpha = 0 #搜索中生成的着法个数
+        self.belta = 0 #搜索中实际展开的着法个数
+        self.stats = None #enableStats 打开后为 SearchStats，关闭时搜索不做任何统计
+        self.use_vcf = USE_VCF
+        self.use_vct = USE_VCT
+        self.use_pvs = USE_PVS
+        self.use_lmr = USE_LMR
+        self.use_futility = USE_FUTILITY
+        self.threat_nodes = 0 #最近一次 findThreatWin 搜索的节点数
+        self.book = None #开局库，见 loadBook
         self.record = [[[0, 0, 0, 0] for x in range(chess_len)] for y in range(chess_len)] #record数组记录所有位置的四个方向是否被检测过
         self.count = [[0 for x in range(8)] for i in range(2)] # count二维数组记录黑棋和白棋的棋型个数统计。
-        self.pos_score = [[(7 - max(abs(x - 7), abs(y - 7))) for x in range(chess_len)] for y in range(chess_len)]# pose_core给棋盘上每个位置设一个初始分数，越靠近棋盘中心，分数越高，用来在最开始没有任何棋型时的，AI优先选取靠中心的位置。
+        center = chess_len // 2
+        self.pos_score = [[(center - max(abs(x - center), abs(y - center))) for x in range(chess_len)] for y in range(chess_len)]# pose_core给棋盘上每个位置设一个初始分数，越靠近棋盘中心，分数越高，用来在最开始没有任何棋型时的，AI优先选取靠中心的位置。
+        self.board = None
+        self.path = [] #当前搜索路径上已经落下的棋子，超时中断时用来恢复棋盘
+        self.deadline = None
+        self.node_limit = None #搜索的节点数超过这个值时中断，和 deadline 一样只在迭代加深时使用
+        self.stopped = False #为 True 时正在进行的搜索尽快中断，见 stop
+        self.search_time = 0 #最近一次 findBestChess 用时（秒）
+        self.search_depth = 0 #最近一次 findBestChess 完成的搜索深度
+        self.search_score = None #最近一次 findBestChess 选出的着法的分数，走的是开局库着法时为 None
+        self.initLines()
+        self.initHash(tt_size)
+        self.initCandidates()
+    def initLines(self): #initLines函数：把棋盘拆成横、竖、两个对角线方向的所有线，增量评估按线统计棋型。
+        # lines[i] = (方向下标, 线上的点, 是否倒序扫描)，点按 DIR_OFFSET 的方向排列，第 k 个点对应位掩码的第 k + LINE_PAD 位。
+        # evaluate 按先 y 后 x 的顺序扫描棋子，副对角线上这个顺序和 (1, -1) 方向相反，所以倒序扫描，
+        # 这样逐线分析时 record 的跳过顺序和整盘扫描完全一致。
+        # cell_lines[y][x][i] = (经过 (x, y) 的第 i 个方向的线的编号, 该点在线上的位)。
+        self.lines = []
+        self.cell_lines = [[[None, None, None, None] for x in range(self.len)] for y in range(self.len)]
+        for dir_index in range(4):
+            groups = {}
+            for y in range(self.len):
+                for x in range(self.len):
+                    if dir_index == 0:
+                        key = y
+                    elif dir_index == 1:
+                        key = x
+                    elif dir_index == 2:
+                        key = x - y
+                    else:
+                        key = x + y
+                    groups.setdefault(key, []).append((x, y))
+            for key in sorted(groups):
+                cells = sorted(groups[key])
+                for i, (x, y) in enumerate(cells):
+                    self.cell_lines[y][x][dir_index] = (len(self.lines), i + LINE_PAD)
+                self.lines.append((dir_index, cells, dir_index == 3))
+        # line_bits[i] = [黑棋位掩码, 白棋位掩码]；line_edge[i] 是线两端棋盘外的位，分析时当作对方的棋子
+        self.line_bits = [[0, 0] for line in self.lines]
+        self.line_edge = [((1 << (len(cells) + 2 * LINE_PAD)) - 1) ^ (((1 << len(cells)) - 1) << LINE_PAD)
+                          for (dir_index, cells, reverse) in self.lines]
+        # cell_keys[y][x] = 经过 (x, y) 的四条线的 (line_bits[编号], 取窗口时右移的位数, 棋盘外的位在窗口里的编码)，
+        # evaluatePointBits 用它拼 point_cache 的键。标准规则的窗口是 11 位，取窗口前位掩码先左移一位。
+        self.cell_keys = [[[] for x in range(self.len)] for y in range(self.len)]
+        for y in range(self.len):
+            for x in range(self.len):
+                for line_id, pos in self.cell_lines[y][x]:
+                    if self.exact_five:
+                        edge = ((self.line_edge[line_id] << 1) >> (pos - LINE_PAD)) & KEY_MASK
+                    else:
+                        edge = (self.line_edge[line_id] >> (pos - LINE_PAD)) & WINDOW_MASK
+                    self.cell_keys[y][x].append((self.line_bits[line_id], pos - LINE_PAD, edge))
+        self.line_count = [[[0 for x in range(8)] for i in range(2)] for line in self.lines] #每条线上黑白双方的棋型个数
+        self.total_count = [[0 for x in range(8)] for i in range(2)] #所有线的棋型个数之和
+    def loadBook(self, path): #loadBook函数：加载开局库文件，之后 findBestChess 先查开局库；path 为 None 时不用开局库。
+        # 开局库的规则和 AI 的规则不同时抛出 ValueError，原来的开局库不变。
+        book = OpeningBook(path) if path is not None else None
+        if book is not None and book.rule != self.rule:
+            book.close()
+            raise ValueError('%s is an opening book for the %s rule' % (path, book.rule))
+        if self.book is not None:
+            self.book.close()
+        self.book = book
+    def enableStats(self, enable=True): #enableStats函数：打开或关闭搜索统计。
+        # 打开时用计时包装替换实例上的 evaluateIncremental、genmove 和线分析函数，关闭时删除包装恢复原方法，
+        # 所以不统计时这些函数没有任何额外开销。
+        for name in ('evaluateIncremental', 'genmove', 'analysisWholeLine', 'analysisLine'):
+            self.__dict__.pop(name, None)
+        if not enable:
+            self.stats = None
+            return
+        stats = SearchStats()
+        self.stats = stats
+        def timed(name, func):
+            def wrapper(*args):
+                start = time.perf_counter()
+                try:
+                    return func(*args)
+                finally:
+                    stats.addTime(name, time.perf_counter() - start)
+            return wrapper
+        self.evaluateIncremental = timed('evaluate', self.evaluateIncremental)
+        self.genmove = timed('genmove', self.genmove)
+        self.analysisWholeLine = timed('analysisLine', self.analysisWholeLine)
+        self.analysisLine = timed('analysisLine', self.analysisLine)
+    def initCandidates(self): #initCandidates函数：准备 genmove 用的候选点集合和位置得分缓存。
+        # cell_around[y][x] 是 (x, y) 周围 8 个点中在棋盘内的点；
+        # cell_affect[y][x] 是四个方向上距离 (x, y) 不超过 4（标准规则下 5）的点，这些点的位置得分会因为 (x, y) 落子或提子而改变。
+        self.cell_around = [[[] for x in range(self.len)] for y in range(self.len)]
+        self.cell_affect = [[[] for x in range(self.len)] for y in range(self.len)]
+        reach = 5 if self.exact_five else 4 #标准规则下，第 5 个点上的棋子也会让五连变成长连
+        for y in range(self.len):
+            for x in range(self.len):
+                for i in range(y - 1, y + 2):
+                    for j in range(x - 1, x + 2):
+                        if (j, i) != (x, y) and 0 <= i < self.len and 0 <= j < self.len:
+                            self.cell_around[y][x].append((j, i))
+                self.cell_affect[y][x].append((x, y))
+                for dir in DIR_OFFSET:
+                    for k in range(-reach, reach + 1):
+                        tmp_x, tmp_y = x + k * dir[0], y + k * dir[1]
+                        if k != 0 and 0 <= tmp_x < self.len and 0 <= tmp_y < self.len:
+                            self.cell_affect[y][x].append((tmp_x, tmp_y))
+        self.neighbor = [[0 for x in range(self.len)] for y in range(self.len)] #周围 8 个点中棋子的个数
+        self.candidates = set() #有相邻棋子的空点，即 genmove 要考虑的点
+        self.point_score = [[None for x in range(self.len)] for y in range(self.len)] #缓存 (黑棋下在这里的得分, 白棋下在这里的得分)
+        self.point_cache = PointCache() #按窗口缓存的位置得分，不同的点、不同的局面之间共用
+    def initHash(self, tt_size): #initHash函数：生成 Zobrist 随机数表并分配置换表。
+        # 随机数种子固定，保证同样的局面在不同进程、不同次运行中得到同样的哈希值
+        rand = Random(self.len)
+        self.zobrist = [[[0, rand.getrandbits(64), rand.getrandbits(64)] for x in range(self.len)] for y in range(self.len)]
+        self.zobrist_turn = rand.getrandbits(64) #轮到白棋走时异或这个值
+        self.hash = 0
+        size = 1
+        while size * 2 <= tt_size: #条目数取不超过上限的 2 的幂，用位与代替取模
+            size *= 2
+        self.tt_mask = size - 1
+        self.tt = [None] * size
+        self.tt_generation = 0
+        self.killers = [] #killers[ply] 是第 ply 层最近引起剪枝的两个着法
+        self.history = [[[0 for x in range(self.len)] for y in range(self.len)] for i in range(2)] #history[颜色 - 1][y][x] 是该点引起剪枝的累计得分
+    def clearCache(self): #clearCache函数：清空置换表和历史得分，之后的搜索不再受之前搜索结果的影响。
+        for i in range(len(self.tt)):
+            self.tt[i] = None
+        self.tt_generation = 0
+        for table in self.history:
+            for row in table:
+                for x in range(self.len):
+                    row[x] = 0
+    def ageHistory(self): #ageHistory函数：每次搜索前把历史得分减半，较早的局面对着法排序的影响逐渐消失。
+        for table in self.history:
+            for row in table:
+                for x in range(self.len):
+                    row[x] >>= 1
+    def probeHash(self, key): #probeHash函数：查找置换表，返回 (key, depth, flag, score, move, generation) 或 None。
+        entry = self.tt[key & self.tt_mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+    def storeHash(self, key, depth, flag, score, move): #storeHash函数：写入置换表。
+        # 替换策略：空位、同一局面、上一次搜索留下的旧条目直接覆盖；
+        # 本次搜索的条目只有在新结果搜索得更深（或一样深）时才覆盖。
+        index = key & self.tt_mask
+        entry = self.tt[index]
+        if (entry is None or entry[0] == key or entry[5] != self.tt_generation
+                or depth >= entry[1]):
+            self.tt[index] = (key, depth, flag, score, move, self.tt_generation)
     def reset(self):  #reset函数：每次调用评估函数前都需要清一下之前的统计数据。
         for y in range(self.len):
             for x in range(self.len):
@@ -42,12 +360,138 @@ class ChessAI():      #chessAI类
         for i in range(len(self.count)):
             for j in range(len(self.count[0])):
                 self.count[i][j] = 0 #将以前的数据清零
+    def setBoard(self, board): #setBoard函数：绑定要搜索的棋盘，并对所有线做一次完整分析，之后由 makeMove/unmakeMove 增量维护。
+        self.board = board
+        self.path = []
+        self.hash = 0
+        for y in range(self.len):
+            for x in range(self.len):
+                if board[y][x] != 0:
+                    self.hash ^= self.zobrist[y][x][board[y][x]]
+        self.candidates.clear()
+        for y in range(self.len):
+            for x in range(self.len):
+                self.point_score[y][x] = None
+                self.neighbor[y][x] = 0
+                for (j, i) in self.cell_around[y][x]:
+                    if board[i][j] != 0:
+                        self.neighbor[y][x] += 1
+                if board[y][x] == 0 and self.neighbor[y][x] > 0:
+                    self.candidates.add((x, y))
+        for i in range(2):
+            for j in range(8):
+                self.total_count[i][j] = 0
+        for line_id, (dir_index, cells, reverse) in enumerate(self.lines):
+            bits = self.line_bits[line_id]
+            bits[0] = bits[1] = 0
+            for i, (x, y) in enumerate(cells):
+                if board[y][x] != 0:
+                    bits[board[y][x] - 1] |= 1 << (i + LINE_PAD)
+            for i in range(2):
+                for j in range(8):
+                    self.line_count[line_id][i][j] = 0
+            self.updateLine(line_id)
+    def analysisWholeLine(self, line_id, count): #analysisWholeLine函数：重新统计一条线上双方的棋型，结果写入 count。
+        # 直接从位掩码移位取出每个棋子周围的 9 位窗口，查 PATTERN_TABLE 得到棋型，不再逐点读棋盘。
+        dir_index, cells, reverse = self.lines[line_id]
+        bits = self.line_bits[line_id]
+        edge = self.line_edge[line_id]
+        for mine in (1, 2):
+            mine_bits = bits[mine - 1]
+            if mine_bits == 0:
+                continue
+            opponent_bits = bits[2 - mine] | edge
+            mine_count = count[mine - 1]
+            exact_five = self.exact_five
+            record = 0
+            rest = mine_bits
+            while rest:
+                if reverse:
+                    pos = rest.bit_length() - 1
+                else:
+                    pos = (rest & -rest).bit_length() - 1
+                rest ^= 1 << pos
+                if (record >> pos) & 1:
+                    continue
+                shift = pos - LINE_PAD
+                chess_types, line_record = PATTERN_TABLE[(((mine_bits >> shift) & WINDOW_MASK) << 9) | ((opponent_bits >> shift) & WINDOW_MASK)]
+                if exact_five and chess_types and chess_types[-1][0] == FIVE and runLength(mine_bits, pos) != 5:
+                    chess_types = chess_types[:-1] #窗口只有 9 位，看不出是不是长连，要在整条线上数
+                for chess_type, num in chess_types:
+                    mine_count[chess_type] += num
+                record |= line_record << shift
+    def updateLine(self, line_id): #updateLine函数：用一条线的新统计替换旧统计，同时更新总数。
+        old_count = self.line_count[line_id]
+        new_count = [[0 for x in range(8)] for i in range(2)]
+        self.analysisWholeLine(line_id, new_count)
+        for i in range(2):
+            total, old, new = self.total_count[i], old_count[i], new_count[i]
+            for j in range(8):
+                total[j] += new[j] - old[j]
+        self.line_count[line_id] = new_count
+    def makeMove(self, x, y, turn): #makeMove函数：落子，并且只重新分析经过该点的四条线。
+        self.board[y][x] = turn
+        self.hash ^= self.zobrist[y][x][turn]
+        self.path.append((x, y))
+        self.candidates.discard((x, y))
+        for (j, i) in self.cell_around[y][x]:
+            self.neighbor[i][j] += 1
+            if self.board[i][j] == 0:
+                self.candidates.add((j, i))
+        for (j, i) in self.cell_affect[y][x]:
+            self.point_score[i][j] = None
+        for line_id, pos in self.cell_lines[y][x]:
+            self.line_bits[line_id][turn - 1] |= 1 << pos
+            self.updateLine(line_id)
+    def unmakeMove(self, x, y): #unmakeMove函数：撤销落子，同样只更新经过该点的四条线。
+        chess = self.board[y][x]
+        self.hash ^= self.zobrist[y][x][chess]
+        self.board[y][x] = 0
+        self.path.pop()
+        for (j, i) in self.cell_around[y][x]:
+            self.neighbor[i][j] -= 1
+            if self.neighbor[i][j] == 0:
+                self.candidates.discard((j, i))
+        if self.neighbor[y][x] > 0:
+            self.candidates.add((x, y))
+        for (j, i) in self.cell_affect[y][x]:
+            self.point_score[i][j] = None
+        for line_id, pos in self.cell_lines[y][x]:
+            self.line_bits[line_id][chess - 1] &= ~(1 << pos)
+            self.updateLine(line_id)
+    def unwindPath(self, base=0): #unwindPath函数：撤销 path 上第 base 步之后的所有落子，中断的搜索用它恢复棋盘。
+        while len(self.path) > base:
+            self.unmakeMove(*self.path[-1])
+    def evaluateIncremental(self, turn, checkWin=False): #evaluateIncremental函数：和 evaluate 结果相同，但直接使用增量维护的棋型统计。
+        if turn == MAP_ENTRY_TYPE.MAP_PLAYER_ONE:
+            mine = 1
+            opponent = 2
+        else:
+            mine = 2
+            opponent = 1
+        mine_count = self.total_count[mine - 1]
+        opponent_count = self.total_count[opponent - 1]
+        if checkWin:
+            return mine_count[FIVE] > 0
+        # getScore 会修改传入的统计，这里传副本
+        mscore, oscore = self.getScore(list(mine_count), list(opponent_count))
+        return (mscore - oscore)
     def click(self, map, x, y, turn):
         map.click(x, y, turn)
     def isWin(self, board, turn):
         return self.evaluate(board, turn, True)
+    def isWinMove(self, board, x, y): #isWinMove函数：刚下在 (x, y) 的棋子是否连成了五，只检查经过这一点的四条线。
+        # 之前的局面没有五连时，只有最后一步可能连成五，不需要像 isWin 那样分析整个棋盘。
+        chess = board[y][x]
+        for dir in ((1, 0), (0, 1), (1, 1), (1, -1)):
+            length = self.boardRunLength(board, x, y, dir, chess)
+            if length == 5 or (length > 5 and not self.exact_five):
+                return True
+        return False
     # 判断位置的得分
     def evaluatePointScore(self, board, x, y, mine, opponent):
+        if board is self.board:
+            return self.evaluatePointBits(x, y, mine, opponent)
         dir_offset = [(1, 0), (0, 1), (1, 1), (1, -1)]
         for i in range(len(self.count)):
             for j in range(len(self.count[0])):
@@ -63,6 +507,42 @@ class ChessAI():      #chessAI类
         oscore = self.getPointScore(opponent_count)
         return (mscore, oscore)
 
+    def evaluatePointBits(self, x, y, mine, opponent): #evaluatePointBits函数：搜索中的棋盘已经有位掩码，直接从掩码取窗口计算位置得分。
+        # 先用四条线上的窗口编码查 point_cache，每条线依次是黑棋、白棋、棋盘外的窗口。
+        # 缓存的是 (黑棋下在这里的得分, 白棋下在这里的得分)，mine 为白棋时交换顺序。
+        key = 0
+        if self.exact_five:
+            for bits, shift, edge in self.cell_keys[y][x]:
+                key = (key << 33) | ((((bits[0] << 1) >> shift) & KEY_MASK) << 22) | ((((bits[1] << 1) >> shift) & KEY_MASK) << 11) | edge
+        else:
+            for bits, shift, edge in self.cell_keys[y][x]:
+                key = (key << 27) | (((bits[0] >> shift) & WINDOW_MASK) << 18) | (((bits[1] >> shift) & WINDOW_MASK) << 9) | edge
+        scores = self.point_cache.get(key)
+        if scores is None:
+            scores = self.analysisPointBits(x, y)
+            self.point_cache.put(key, scores)
+        if mine == 1:
+            return scores
+        return (scores[1], scores[0])
+    def analysisPointBits(self, x, y): #analysisPointBits函数：从位掩码取窗口查 PATTERN_TABLE，返回黑棋和白棋下在 (x, y) 的得分。
+        mine, opponent = 1, 2
+        mine_count = [0 for i in range(8)]
+        opponent_count = [0 for i in range(8)]
+        for line_id, pos in self.cell_lines[y][x]:
+            bits = self.line_bits[line_id]
+            edge = self.line_edge[line_id]
+            shift = pos - LINE_PAD
+            for chess, other, count in ((mine, opponent, mine_count), (opponent, mine, opponent_count)):
+                line_bits = bits[chess - 1] | (1 << pos)
+                mine_bits = (line_bits >> shift) & WINDOW_MASK
+                opponent_bits = ((bits[other - 1] | edge) >> shift) & WINDOW_MASK
+                chess_types = PATTERN_TABLE[(mine_bits << 9) | opponent_bits][0]
+                if self.exact_five and chess_types and chess_types[-1][0] == FIVE and runLength(line_bits, pos) != 5:
+                    chess_types = chess_types[:-1]
+                for chess_type, num in chess_types:
+                    count[chess_type] += num
+        return (self.getPointScore(mine_count), self.getPointScore(opponent_count))
+
     def hasNeighbor(self, board, x, y, radius):
         start_x, end_x = (x - radius), (x + radius)
         start_y, end_y = (y - radius), (y + radius)
@@ -85,80 +565,543 @@ class ChessAI():      #chessAI类
             mine = 2
             opponent = 1
         moves = []
-        radius = 1
-        for y in range(self.len):
-            for x in range(self.len):
-                if board[y][x] == 0 and self.hasNeighbor(board, x, y, radius):
-                    mscore, oscore = self.evaluatePointScore(board, x, y, mine, opponent)
-                    point = (max(mscore, oscore), x, y)
-                    if mscore >= SCORE_FIVE or oscore >= SCORE_FIVE:
-                        fives.append(point)
-                    elif mscore >= SCORE_FOUR:
-                        mfours.append(point)
-                    elif oscore >= SCORE_FOUR:
-                        ofours.append(point)
-                    elif mscore >= SCORE_SFOUR:
-                        msfours.append(point)
-                    elif oscore >= SCORE_SFOUR:
-                        osfours.append(point)
-                    moves.append(point)
+        # 候选点和位置得分由 makeMove/unmakeMove 增量维护，这里只重新计算受最近落子影响的点
+        if board is not self.board:
+            self.setBoard(board)
+        for (x, y) in self.candidates:
+            scores = self.point_score[y][x]
+            if scores is None:
+                scores = self.evaluatePointBits(x, y, 1, 2)
+                self.point_score[y][x] = scores
+            mscore, oscore = scores[mine - 1], scores[opponent - 1]
+            point = (max(mscore, oscore), x, y)
+            if mscore >= SCORE_FIVE or oscore >= SCORE_FIVE:
+                fives.append(point)
+            elif mscore >= SCORE_FOUR:
+                mfours.append(point)
+            elif oscore >= SCORE_FOUR:
+                ofours.append(point)
+            elif mscore >= SCORE_SFOUR:
+                msfours.append(point)
+            elif oscore >= SCORE_SFOUR:
+                osfours.append(point)
+            moves.append(point)
+        # 集合没有顺序，按逐行扫描棋盘的顺序返回，保证结果和扫描整个棋盘时一样
+        def scanOrder(point):
+            return (point[2], point[1])
         if len(fives) > 0:
-            return fives
+            return sorted(fives, key=scanOrder)
         if len(mfours) > 0:
-            return mfours
+            return sorted(mfours, key=scanOrder)
         if len(ofours) > 0:
             if len(msfours) == 0:
-                return ofours
+                return sorted(ofours, key=scanOrder)
             else:
-                return ofours + msfours
+                return sorted(ofours, key=scanOrder) + sorted(msfours, key=scanOrder)
         moves.sort(reverse=True)
         if self.maxdepth > 2 and len(moves) > LIMITED_MOVE_NUM:
             moves = moves[:LIMITED_MOVE_NUM]
         return moves
 
     def __search(self, board, turn, depth, alpha=SCORE_MIN, beta=SCORE_MAX):
-        score = self.evaluate(board, turn)
-        if depth <= 0 or abs(score) >= SCORE_FIVE:
-            return score
+        if self.stats is not None:
+            self.stats.addNode(len(self.path))
+        if depth <= 0:
+            return self.evaluateIncremental(turn)
+        if self.path:
+            # 父节点没有五连，只有对方刚下的一步可能连成五，查经过这一步的四条线就够了，不用计算整个局面的分数
+            x, y = self.path[-1]
+            if self.isWinMove(board, x, y):
+                return -SCORE_FIVE
+        elif abs(self.evaluateIncremental(turn)) >= SCORE_FIVE:
+            return self.evaluateIncremental(turn)
+        if (self.stopped or (self.deadline is not None and time.time() > self.deadline)
+                or (self.node_limit is not None and self.belta > self.node_limit)):
+            raise SearchTimeout()
+        # 查置换表：同一局面换个走子顺序到达时直接用之前的结果。根节点要求出最佳着法，不直接返回。
+        key = self.hash if turn == MAP_ENTRY_TYPE.MAP_PLAYER_ONE else self.hash ^ self.zobrist_turn
+        entry = self.probeHash(key)
+        hash_move = None
+        if depth == self.maxdepth:
+            hash_move = self.pv_move #迭代加深时，上一轮的最佳着法先搜
+        if entry is not None:
+            if entry[4] is not None:
+                hash_move = entry[4]
+            if entry[1] >= depth and depth != self.maxdepth:
+                flag, value = entry[2], entry[3]
+                if (flag == TT_EXACT or (flag == TT_LOWER and value >= beta)
+                        or (flag == TT_UPPER and value <= alpha)):
+                    if self.stats is not None:
+                        self.stats.hash_hits += 1
+                    return value
         moves = self.genmove(board, turn)
         bestmove = None
         self.alpha += len(moves)
         # 如果没有移动，则返回分数
         if len(moves) == 0:
-            return score
-        for _, x, y in moves:
-            board[y][x] = turn
-            if turn == MAP_ENTRY_TYPE.MAP_PLAYER_ONE:
-                op_turn = MAP_ENTRY_TYPE.MAP_PLAYER_TWO
-            else:
-                op_turn = MAP_ENTRY_TYPE.MAP_PLAYER_ONE
-            score = - self.__search(board, op_turn, depth - 1, -beta, -alpha)
-            board[y][x] = 0
+            return self.evaluateIncremental(turn)
+        ply = len(self.path) #离根节点的步数；减少过深度的节点剩余深度更小，不能用 maxdepth - depth
+        moves = self.orderMoves(moves, turn, ply, hash_move)
+        alpha_orig = alpha
+        best = SCORE_MIN #所有着法中的最高分，可能低于 alpha 或高于 beta，比 alpha 本身更能说明局面的好坏
+        if turn == MAP_ENTRY_TYPE.MAP_PLAYER_ONE:
+            op_turn = MAP_ENTRY_TYPE.MAP_PLAYER_TWO
+        else:
+            op_turn = MAP_ENTRY_TYPE.MAP_PLAYER_ONE
+        # 对方有冲四或活四时每个着法都关系到能否挡住，不减少深度也不剪枝
+        count = self.total_count[op_turn - 1]
+        threatened = count[FOUR] + count[SFOUR] > 0
+        futility = None
+        if self.use_futility and depth < len(FUTILITY_MARGIN) and not threatened:
+            futility = self.evaluateIncremental(turn) + FUTILITY_MARGIN[depth]
+            if futility > alpha:
+                futility = None
+        for i, (point_score, x, y) in enumerate(moves):
+            # 第一个着法不会被减少深度或剪掉，不用判断
+            quiet = i > 0 and point_score < QUIET_SCORE and not threatened and not self.makesFour(x, y, turn)
+            if futility is not None and quiet:
+                # 无用剪枝：平静着法最多把评分提高 FUTILITY_MARGIN，仍然不超过 alpha，不用搜索，futility 作为它的分数上界
+                if self.stats is not None:
+                    self.stats.futility_prunes += 1
+                if futility > best:
+                    best = futility
+                continue
+            self.makeMove(x, y, turn)
+            score = None
+            reduction = LMR_REDUCTIONS[min(i, len(LMR_REDUCTIONS) - 1)]
+            # 根节点的着法减少深度后至少还要搜索一层，浅的搜索不能直接用静态评分代替
+            if self.use_lmr and quiet and depth >= LMR_DEPTH and reduction > 0 and (ply > 0 or depth - 1 - reduction > 0):
+                # 靠后的平静着法先减少深度用零窗口试探，分数不超过 alpha 就不再细算，超过时按完整深度重新搜索
+                score = - self.__search(board, op_turn, depth - 1 - reduction, -alpha - 1, -alpha)
+                if self.stats is not None:
+                    self.stats.reductions += 1
+                if score > alpha:
+                    score = None
+                    if self.stats is not None:
+                        self.stats.re_searches += 1
+            if score is None and (bestmove is None or not self.use_pvs or depth < PVS_DEPTH):
+                score = - self.__search(board, op_turn, depth - 1, -beta, -alpha)
+            elif score is None:
+                # 主要变例搜索：已经有着法超过 alpha 后，其余着法先用零窗口试探能否比它好，
+                # 能的才重新搜索求出准确分数；试探得到的 score 是下界，重新搜索的窗口从 score - 1 开始
+                score = - self.__search(board, op_turn, depth - 1, -alpha - 1, -alpha)
+                if alpha < score < beta:
+                    score = - self.__search(board, op_turn, depth - 1, -beta, -(score - 1))
+            self.unmakeMove(x, y)
             self.belta += 1
+            if score > best:
+                best = score
             # alpha/beta 剪枝
             if score > alpha:
                 alpha = score
                 bestmove = (x, y)
                 if alpha >= beta:
+                    if self.stats is not None:
+                        self.stats.addCutoff(ply, (x, y) == (moves[0][1], moves[0][2]))
+                    # 引起剪枝的着法记为这一层的杀手着法，并按剩余深度加历史得分
+                    killers = self.killers[ply]
+                    if killers[0] != bestmove:
+                        killers[1] = killers[0]
+                        killers[0] = bestmove
+                    self.history[turn - 1][y][x] += depth * depth
                     break
         if depth == self.maxdepth and bestmove:
             self.bestmove = bestmove
-        return alpha
-    def search(self, board, turn, depth=5):
+        if best <= alpha_orig:
+            flag = TT_UPPER
+        elif best >= beta:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        self.storeHash(key, depth, flag, best, bestmove)
+        return best
+    def orderMoves(self, moves, turn, ply, hash_move): #orderMoves函数：调整 genmove 返回的着法顺序。
+        # 置换表里记录的最佳着法最先，其次是这一层的两个杀手着法，其余按着法得分从高到低，同分时历史得分高的在前。
+        # 历史得分只用来区分同分着法：直接按它排序会打乱静态评分的顺序，实测展开的节点反而更多。
+        history = self.history[turn - 1]
+        first = [hash_move] + self.killers[ply]
+        def priority(point):
+            move = (point[1], point[2])
+            if move in first:
+                return (3 - first.index(move), 0)
+            return (0, point[0], history[point[2]][point[1]])
+        return sorted(moves, key=priority, reverse=True)
+    def search(self, board, turn, depth=5, pv_move=None, guess=None):
+        # guess 是预计的分数（迭代加深时上一轮的分数），给出时先用它附近的渴望窗口搜索，
+        # 真实分数落在窗口外时再用完整窗口重新搜索，所以结果和不给 guess 时一样。
         self.maxdepth = depth
         self.bestmove = None
-        score = self.__search(board, turn, depth)
+        self.killers = [[None, None] for i in range(depth + 1)]
+        self.ageHistory()
+        self.pv_move = pv_move
+        self.tt_generation += 1
+        self.setBoard(board)
+        if not self.candidates: #空棋盘上没有候选着法，下在中心
+            center = self.len // 2
+            return self.evaluateIncremental(turn), center, center
+        if self.workers > 1 and depth > 1:
+            return self.parallelSearch(board, turn, depth)
+        try:
+            if guess is not None:
+                alpha, beta = guess - ASPIRATION_WINDOW, guess + ASPIRATION_WINDOW
+                score = self.__search(board, turn, depth, alpha, beta)
+                if alpha < score < beta:
+                    x, y = self.bestmove
+                    return score, x, y
+                self.bestmove = None
+            score = self.__search(board, turn, depth)
+        except SearchTimeout:
+            # 超时或被 stop 中断时路径上的棋子还在调用者的棋盘上，撤销后再抛出
+            self.unwindPath()
+            raise
         x, y = self.bestmove
         return score, x, y
 
-    def findBestChess(self, board, turn):  #findBestChess 函数是AI的入口函数。连动调用search和genmove
+    def searchMove(self, board, turn, depth, x, y, alpha=SCORE_MIN): #searchMove函数：只搜索根节点的一个着法 (x, y)，返回它对 turn 一方的得分。
+        # 和 search 用同样的 maxdepth，所以得到的分数和在 search 的根节点搜索这个着法时一样
+        self.maxdepth = depth
+        self.pv_move = None
+        self.killers = [[None, None] for i in range(depth + 1)]
+        self.setBoard(board)
+        if turn == MAP_ENTRY_TYPE.MAP_PLAYER_ONE:
+            op_turn = MAP_ENTRY_TYPE.MAP_PLAYER_TWO
+        else:
+            op_turn = MAP_ENTRY_TYPE.MAP_PLAYER_ONE
+        self.makeMove(x, y, turn)
+        try:
+            score = - self.__search(board, op_turn, depth - 1, -SCORE_MAX, -alpha)
+        finally:
+            self.unwindPath() #正常结束时路径上只有 (x, y)，被中断时还有更深的棋子
+        self.belta += 1
+        return score
+
+    def parallelSearch(self, board, turn, depth): #parallelSearch函数：把根节点的着法分给进程池搜索，汇总出最佳着法。
+        if self.pool is None:
+            self.shared_alpha = multiprocessing.Value('q', SCORE_MIN)
+            self.pool = multiprocessing.Pool(self.workers, initializer=initSearchWorker,
+                                             initargs=(self.len, self.tt_size, self.shared_alpha, self.rule))
+        moves = self.genmove(board, turn)
+        self.alpha += len(moves)
+        if self.pv_move is not None:
+            for i in range(len(moves)):
+                if (moves[i][1], moves[i][2]) == self.pv_move:
+                    moves.insert(0, moves.pop(i))
+                    break
+        self.shared_alpha.value = SCORE_MIN
+        share = not self.deterministic
+        # 选择性搜索的分数和搜索窗口有关，deterministic 时工作进程不做 LMR 和无用剪枝，保证结果可以复现
+        tasks = [(board, turn, depth, x, y, share, self.deadline, self.use_lmr and share, self.use_futility and share)
+                 for _, x, y in moves]
+        results = self.pool.map(searchMoveWorker, tasks, chunksize=1)
+        if None in results:
+            raise SearchTimeout()
+        # 按 genmove 的顺序取第一个最高分，和单进程搜索根节点时的选择一致；
+        # 共享 alpha 时，没有超过搜索开始时 alpha 的结果只是上界，不参与比较。
+        best = None
+        for (_, x, y), (score, alpha, generated, searched) in zip(moves, results):
+            self.alpha += generated
+            self.belta += searched
+            if score > alpha and (best is None or score > best[0]):
+                best = (score, x, y)
+        self.bestmove = (best[1], best[2])
+        return best
+
+    def stop(self): #stop函数：让正在进行的搜索尽快结束，可以从其他线程调用。下一次搜索前要把 stopped 设回 False。
+        # 固定深度搜索被中断时 findBestChess 抛出 SearchTimeout，限时搜索返回已完成的最好结果
+        self.stopped = True
+
+    def predictMove(self, board, turn, depth=PONDER_DEPTH): #predictMove函数：预测 turn 一方在 board 局面下的着法，用于在对方思考时后台搜索。
+        # 刚搜索完的置换表里一般已经有这个局面（主要变例的第二步）的最佳着法，有就直接用，否则做一次浅的搜索。
+        self.setBoard(board)
+        key = self.hash if turn == MAP_ENTRY_TYPE.MAP_PLAYER_ONE else self.hash ^ self.zobrist_turn
+        entry = self.probeHash(key)
+        if entry is not None and entry[4] is not None:
+            return entry[4]
+        score, x, y = self.search(board, turn, depth)
+        return (x, y)
+
+    def close(self): #close函数：关闭并行搜索的进程池。
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def findBestChess(self, board, turn, time_limit=SEARCH_TIME, depth=SEARCH_DEPTH, node_limit=None, max_depth=MAX_SEARCH_DEPTH):  #findBestChess 函数是AI的入口函数。连动调用search和genmove
+        # time_limit 和 node_limit 都为 None 时按 depth 固定深度搜索；
+        # 否则从深度 1 开始迭代加深，到截止时间、搜索的节点数超过 node_limit 或者搜索完 max_depth 后返回最后一轮完整搜索的结果。
         time1 = time.time()
         self.alpha = 0
         self.belta = 0
-        score, x, y = self.search(board, turn, SEARCH_DEPTH)
+        if self.stats is not None:
+            self.stats.reset()
+        move = None
+        self.search_score = None
+        if self.book is not None:
+            move = self.book.probe(board, turn)
+        if move is None and (self.use_vcf or self.use_vct):
+            # 威胁搜索也不能超过这一步的时间和节点数限制
+            threat_time = THREAT_TIME_LIMIT if time_limit is None else min(THREAT_TIME_LIMIT, time_limit)
+            threat_nodes = THREAT_NODE_LIMIT if node_limit is None else min(THREAT_NODE_LIMIT, node_limit)
+            move = self.findThreatWin(board, turn, self.use_vct, threat_nodes, threat_time)
+            if move is not None:
+                self.search_score = SCORE_FIVE
+        if move is not None:
+            x, y = move
+            self.search_depth = 0
+        elif time_limit is None and node_limit is None:
+            score, x, y = self.search(board, turn, depth)
+            self.search_depth = depth
+            self.search_score = score
+        else:
+            x, y = self.iterativeSearch(board, turn, None if time_limit is None else time1 + time_limit, node_limit, max_depth)
         time2 = time.time()
+        self.search_time = time2 - time1
+        if self.stats is not None:
+            self.stats.search_time = self.search_time
         return (x, y)
 
+    def iterativeSearch(self, board, turn, deadline, node_limit=None, max_depth=MAX_SEARCH_DEPTH):
+        #iterativeSearch函数：迭代加深搜索，最深搜到 max_depth，超过 deadline 或 node_limit 立即中断。
+        bestmove = None
+        scores = []
+        self.search_depth = 0
+        for depth in range(1, max_depth + 1):
+            # 第一轮不设截止时间，保证总有一个完整的结果
+            self.deadline = deadline if bestmove is not None else None
+            self.node_limit = node_limit if bestmove is not None else None
+            # 分数随深度的奇偶来回摆动，用上上轮（同奇偶）的分数作为渴望窗口的中心
+            guess = scores[-2] if len(scores) >= 2 else None
+            try:
+                score, x, y = self.search(board, turn, depth, bestmove, guess)
+            except SearchTimeout: #search 已经撤销了路径上的棋子
+                if bestmove is None: #只有被 stop 中断第一轮时才会没有结果
+                    raise
+                break
+            finally:
+                self.deadline = None
+                self.node_limit = None
+            bestmove = (x, y)
+            scores.append(score)
+            self.search_depth = depth
+            self.search_score = score
+            if (abs(score) >= SCORE_FIVE or not self.candidates or (deadline is not None and time.time() > deadline)
+                    or (node_limit is not None and self.belta > node_limit)):
+                break
+        return bestmove
+
+    # 以下是只考虑进攻着法的威胁空间搜索：VCF 只用冲四，VCT 再加上活三。
+    # 进攻方每一步都必须是威胁，防守方只考虑能化解威胁的着法，所以能比普通搜索算得深得多。
+    def findThreatWin(self, board, turn, vct=False, node_limit=THREAT_NODE_LIMIT, time_limit=None):
+        #findThreatWin函数：寻找 turn 一方的连续冲四（vct 为 True 时还有活三）必胜，返回第一步，找不到返回 None。
+        # 超过 node_limit 个节点或 time_limit 秒后放弃，也返回 None。
+        self.setBoard(board)
+        attacker = int(turn)
+        defender = 3 - attacker
+        self.threat_nodes = 0
+        self.threat_node_limit = node_limit
+        self.threat_deadline = None if time_limit is None else time.time() + time_limit
+        self.threat_cache = {} #局面哈希 -> 已经确认不能取胜的最大步数
+        base = len(self.path)
+        try:
+            move = self.__vcf(attacker, defender, VCF_DEPTH)
+            if move is None and vct:
+                self.threat_cache = {}
+                move = self.__vct(attacker, defender, VCT_DEPTH)
+        except SearchTimeout:
+            self.unwindPath(base)
+            move = None
+        return move
+
+    def threatNode(self): #threatNode函数：威胁搜索的节点计数，超过节点数或时间上限时中断搜索。
+        self.threat_nodes += 1
+        if self.threat_nodes > self.threat_node_limit or self.stopped:
+            raise SearchTimeout()
+        if self.threat_deadline is not None and time.time() > self.threat_deadline:
+            raise SearchTimeout()
+
+    def lineFivePoints(self, mine, occupied, start, end): #lineFivePoints函数：一条线上第 start 到 end 位之间，己方下一子就能连成五的空位。
+        # 结果只和 start - 5 到 end + 5 之间的位有关（标准规则要看五连两端是不是己方棋子），按这一段的掩码缓存
+        shift = max(0, start - 5)
+        mask = (1 << (end + 6 - shift)) - 1
+        key = ((mine >> shift) & mask, (occupied >> shift) & mask, start - shift, end - shift, self.exact_five)
+        points = FIVE_POINT_CACHE.get(key)
+        if points is None:
+            mine, occupied = key[0], key[1]
+            points = []
+            for pos in range(key[2], key[3] + 1):
+                if (occupied >> pos) & 1:
+                    continue
+                bits = mine | (1 << pos)
+                if self.exact_five:
+                    if runLength(bits, pos) == 5:
+                        points.append(pos)
+                    continue
+                run = bits & (bits >> 1)
+                run &= run >> 2
+                if run & (bits >> 4):
+                    points.append(pos)
+            if len(FIVE_POINT_CACHE) >= FIVE_POINT_CACHE_SIZE:
+                FIVE_POINT_CACHE.clear()
+            FIVE_POINT_CACHE[key] = points
+        return [shift + pos for pos in points]
+
+    def fivePoints(self, chess): #fivePoints函数：棋盘上 chess 一方下一子就能连成五的所有空位。
+        points = []
+        # 能连成五必然已经有冲四或活四，棋型统计里没有时不用逐线检查
+        count = self.total_count[chess - 1]
+        if count[FOUR] + count[SFOUR] + count[FIVE] == 0:
+            return points
+        for line_id, (dir_index, cells, reverse) in enumerate(self.lines):
+            bits = self.line_bits[line_id]
+            if bin(bits[chess - 1]).count('1') < 4:
+                continue
+            occupied = bits[0] | bits[1] | self.line_edge[line_id]
+            for pos in self.lineFivePoints(bits[chess - 1], occupied, LINE_PAD, LINE_PAD + len(cells) - 1):
+                if cells[pos - LINE_PAD] not in points:
+                    points.append(cells[pos - LINE_PAD])
+        return points
+
+    def makesFour(self, x, y, chess): #makesFour函数：chess 一方下在空位 (x, y) 后，经过这一点的线上是否有成五点（冲四或活四）。
+        for line_id, pos in self.cell_lines[y][x]:
+            bits = self.line_bits[line_id]
+            mine = bits[chess - 1] | (1 << pos)
+            if bin((mine >> (pos - 4)) & WINDOW_MASK).count('1') < 4:
+                continue
+            occupied = bits[0] | bits[1] | self.line_edge[line_id] | (1 << pos)
+            if self.lineFivePoints(mine, occupied, pos - 4, pos + 4):
+                return True
+        return False
+
+    def fivePointsAt(self, x, y, chess): #fivePointsAt函数：经过 (x, y) 的四条线上，chess 一方下一子就能连成五的空位。
+        points = []
+        for line_id, pos in self.cell_lines[y][x]:
+            bits = self.line_bits[line_id]
+            occupied = bits[0] | bits[1] | self.line_edge[line_id]
+            cells = self.lines[line_id][1]
+            for point in self.lineFivePoints(bits[chess - 1], occupied, pos - 4, pos + 4):
+                if cells[point - LINE_PAD] not in points:
+                    points.append(cells[point - LINE_PAD])
+        return points
+
+    def lineOpenFour(self, mine, occupied, center): #lineOpenFour函数：一条线上 center 附近是否有一个空位，己方下在那里就有两个成五点（活四）。
+        for pos in range(center - 4, center + 5):
+            if (occupied >> pos) & 1:
+                continue
+            if len(self.lineFivePoints(mine | (1 << pos), occupied | (1 << pos), pos - 4, pos + 4)) >= 2:
+                return True
+        return False
+
+    def threatMoves(self, chess, three): #threatMoves函数：chess 一方能形成冲四（three 为 True 时还有活三）的空位，冲四在前。
+        fours, threes = [], []
+        for line_id, (dir_index, cells, reverse) in enumerate(self.lines):
+            bits = self.line_bits[line_id]
+            mine = bits[chess - 1]
+            if bin(mine).count('1') < (2 if three else 3):
+                continue
+            occupied = bits[0] | bits[1] | self.line_edge[line_id]
+            for i, cell in enumerate(cells):
+                pos = i + LINE_PAD
+                if (occupied >> pos) & 1:
+                    continue
+                near = bin((mine >> (pos - 4)) & WINDOW_MASK).count('1')
+                if near >= 3 and self.lineFivePoints(mine | (1 << pos), occupied | (1 << pos), pos - 4, pos + 4):
+                    fours.append(cell)
+                elif three and near >= 2 and self.lineOpenFour(mine | (1 << pos), occupied | (1 << pos), pos):
+                    threes.append(cell)
+        # 同一个点可能在多条线上形成威胁，去重后按进攻方的位置得分排序
+        def order(cells):
+            result = []
+            for cell in cells:
+                if cell not in result:
+                    result.append(cell)
+            result.sort(key=lambda cell: -self.evaluatePointBits(cell[0], cell[1], chess, 3 - chess)[0])
+            return result
+        fours = order(fours)
+        threes = [cell for cell in order(threes) if cell not in fours]
+        return fours + threes
+
+    def threeDefences(self, x, y, chess): #threeDefences函数：(x, y) 落子形成活三后，对方能阻止它变成活四的空位。
+        defences = []
+        for line_id, pos in self.cell_lines[y][x]:
+            bits = self.line_bits[line_id]
+            mine = bits[chess - 1]
+            occupied = bits[0] | bits[1] | self.line_edge[line_id]
+            if not self.lineOpenFour(mine, occupied, pos):
+                continue
+            cells = self.lines[line_id][1]
+            for block in range(pos - 5, pos + 6):
+                if block < LINE_PAD or block >= LINE_PAD + len(cells) or (occupied >> block) & 1:
+                    continue
+                if not self.lineOpenFour(mine, occupied | (1 << block), pos):
+                    cell = cells[block - LINE_PAD]
+                    if cell not in defences:
+                        defences.append(cell)
+        return defences
+
+    def __vcf(self, attacker, defender, depth): #__vcf函数：进攻方连续冲四能否取胜，能则返回第一步。
+        self.threatNode()
+        points = self.fivePoints(attacker)
+        if points:
+            return points[0]
+        if depth <= 0 or self.fivePoints(defender):
+            return None
+        if self.threat_cache.get(self.hash, -1) >= depth:
+            return None
+        for (x, y) in self.threatMoves(attacker, False):
+            self.makeMove(x, y, attacker)
+            replies = self.fivePointsAt(x, y, attacker)
+            win = len(replies) >= 2 #活四或双冲四，对方挡不住
+            if len(replies) == 1:
+                bx, by = replies[0]
+                self.makeMove(bx, by, defender)
+                win = self.__vcf(attacker, defender, depth - 1) is not None
+                self.unmakeMove(bx, by)
+            self.unmakeMove(x, y)
+            if win:
+                return (x, y)
+        self.threat_cache[self.hash] = depth
+        return None
+
+    def __vct(self, attacker, defender, depth): #__vct函数：进攻方用冲四和活三连续进攻能否取胜，能则返回第一步。
+        self.threatNode()
+        points = self.fivePoints(attacker)
+        if points:
+            return points[0]
+        threats = self.fivePoints(defender)
+        if depth <= 0 or len(threats) >= 2:
+            return None
+        if self.threat_cache.get(self.hash, -1) >= depth:
+            return None
+        if threats:
+            moves = threats #对方有冲四，必须先挡，挡的这一步本身也要是威胁
+        else:
+            moves = self.threatMoves(attacker, True)
+        for (x, y) in moves:
+            self.makeMove(x, y, attacker)
+            replies = self.fivePointsAt(x, y, attacker)
+            if len(replies) >= 2:
+                win = True
+            else:
+                if len(replies) == 0:
+                    # 活三：对方可以挡活三，也可以先冲四反击
+                    replies = self.threeDefences(x, y, attacker)
+                    if replies:
+                        for cell in self.threatMoves(defender, False):
+                            if cell not in replies:
+                                replies.append(cell)
+                win = len(replies) > 0
+                for (bx, by) in replies:
+                    self.makeMove(bx, by, defender)
+                    win = self.__vct(attacker, defender, depth - 1) is not None
+                    self.unmakeMove(bx, by)
+                    if not win:
+                        break
+            self.unmakeMove(x, y)
+            if win:
+                return (x, y)
+        self.threat_cache[self.hash] = depth
+        return None
+
     def getPointScore(self, count):
         score = 0
         if count[FIVE] > 0:
@@ -279,17 +1222,51 @@ class ChessAI():      #chessAI类
         return line
     def analysisLine(self, board, x, y, dir_index, dir, mine, opponent, count):#analysisLine函数
         # 是判断一条线上自己棋能形成棋型的代码， mine表示自己棋的值，opponent表示对手棋的值。
-        #要根据中心点相邻己方棋子能连成的个数来分别判断，己方棋值设为M，对方棋值设为P，空点值设为X。
-        def setRecord(self, x, y, left, right, dir_index, dir_offset):#setRecord函数 标记已经检测过，需要跳过的棋子。
-            tmp_x = x + (-5 + left) * dir_offset[0]
-            tmp_y = y + (-5 + left) * dir_offset[1]
-            for i in range(left, right + 1):
-                tmp_x += dir_offset[0]
-                tmp_y += dir_offset[1]
+        # 把长度为9的线编码成窗口查 PATTERN_TABLE，得到棋型统计和需要跳过的棋子，再标记到 record 数组。
+        mine_bits = opponent_bits = 0
+        tmp_x = x + (-5 * dir[0])
+        tmp_y = y + (-5 * dir[1])
+        for i in range(9):
+            tmp_x += dir[0]
+            tmp_y += dir[1]
+            if (tmp_x < 0 or tmp_x >= self.len or
+                    tmp_y < 0 or tmp_y >= self.len):
+                opponent_bits |= 1 << i  # set out of range as opponent chess
+            elif board[tmp_y][tmp_x] == mine:
+                mine_bits |= 1 << i
+            elif board[tmp_y][tmp_x] == opponent:
+                opponent_bits |= 1 << i
+        chess_types, record = PATTERN_TABLE[(mine_bits << 9) | opponent_bits]
+        if self.exact_five and chess_types and chess_types[-1][0] == FIVE and self.boardRunLength(board, x, y, dir, mine) != 5:
+            chess_types = chess_types[:-1]
+        for chess_type, num in chess_types:
+            count[chess_type] += num
+        tmp_x = x + (-5 * dir[0])
+        tmp_y = y + (-5 * dir[1])
+        for i in range(9):
+            tmp_x += dir[0]
+            tmp_y += dir[1]
+            if (record >> i) & 1:
                 self.record[tmp_y][tmp_x][dir_index] = 1
+        return CHESS_TYPE.NONE
+    def boardRunLength(self, board, x, y, dir, mine): #boardRunLength函数：棋盘上经过 (x, y) 沿 dir 方向连续的 mine 棋子个数。
+        length = 1
+        for sign in (1, -1):
+            tmp_x, tmp_y = x + sign * dir[0], y + sign * dir[1]
+            while 0 <= tmp_x < self.len and 0 <= tmp_y < self.len and board[tmp_y][tmp_x] == mine:
+                length += 1
+                tmp_x += sign * dir[0]
+                tmp_y += sign * dir[1]
+        return length
+    def analysisWindow(self, line, mine, opponent, count):#analysisWindow函数
+        # 只用来生成 PATTERN_TABLE，搜索和评估时直接查表。
+        #要根据中心点相邻己方棋子能连成的个数来分别判断，己方棋值设为M，对方棋值设为P，空点值设为X。
+        # 返回值的第 i 位为 1 表示线上第 i 个点已经检测过，需要跳过。
+        def setRecord(left, right):#setRecord函数 标记已经检测过，需要跳过的棋子。
+            record[0] |= ((1 << (right - left + 1)) - 1) << left
+        record = [0]
         empty = MAP_ENTRY_TYPE.MAP_EMPTY.value
         left_idx, right_idx = 4, 4
-        line = self.getLine(board, x, y, dir, mine, opponent)
         while right_idx < 8:
             if line[right_idx + 1] != mine:
                 break
@@ -309,9 +1286,9 @@ class ChessAI():      #chessAI类
             left_range -= 1
         chess_range = right_range - left_range + 1
         if chess_range < 5:
-            setRecord(self, x, y, left_range, right_range, dir_index, dir)
-            return CHESS_TYPE.NONE
-        setRecord(self, x, y, left_idx, right_idx, dir_index, dir)
+            setRecord(left_range, right_range)
+            return record[0]
+        setRecord(left_idx, right_idx)
         m_range = right_idx - left_idx + 1
         # M:自己的棋子, P:对手的棋子或者超出范围, X: 空
         if m_range >= 5:
@@ -336,13 +1313,13 @@ class ChessAI():      #chessAI类
             left_four = right_four = False
             if line[left_idx - 1] == empty:
                 if line[left_idx - 2] == mine:  # MXMMM
-                    setRecord(self, x, y, left_idx - 2, left_idx - 1, dir_index, dir)
+                    setRecord(left_idx - 2, left_idx - 1)
                     count[SFOUR] += 1
                     left_four = True
                 left_empty = True
             if line[right_idx + 1] == empty:
                 if line[right_idx + 2] == mine:  # MMMXM
-                    setRecord(self, x, y, right_idx + 1, right_idx + 2, dir_index, dir)
+                    setRecord(right_idx + 1, right_idx + 2)
                     count[SFOUR] += 1
                     right_four = True
                 right_empty = True
@@ -366,7 +1343,7 @@ class ChessAI():      #chessAI类
             left_three = right_three = False
             if line[left_idx - 1] == empty:
                 if line[left_idx - 2] == mine:
-                    setRecord(self, x, y, left_idx - 2, left_idx - 1, dir_index, dir)
+                    setRecord(left_idx - 2, left_idx - 1)
                     if line[left_idx - 3] == empty:
                         if line[right_idx + 1] == empty:  # XMXMMX
                             count[THREE] += 1
@@ -381,7 +1358,7 @@ class ChessAI():      #chessAI类
             if line[right_idx + 1] == empty:
                 if line[right_idx + 2] == mine:
                     if line[right_idx + 3] == mine:  # MMXMM
-                        setRecord(self, x, y, right_idx + 1, right_idx + 2, dir_index, dir)
+                        setRecord(right_idx + 1, right_idx + 2)
                         count[SFOUR] += 1
                         right_three = True
                     elif line[right_idx + 3] == empty:
@@ -421,4 +1398,51 @@ class ChessAI():      #chessAI类
                 elif line[right_idx + 2] == empty:
                     if line[right_idx + 3] == mine and line[right_idx + 4] == empty:  # XMXXMX
                         count[TWO] += 1
-        return CHESS_TYPE.NONE
\ No newline at end of file
+        return record[0]
+search_worker_ai = None #进程池中每个工作进程自己的 ChessAI，置换表在同一进程的任务之间复用
+search_worker_alpha = None
+def initSearchWorker(chess_len, tt_size, shared_alpha, rule): #initSearchWorker函数：进程池的初始化函数。
+    global search_worker_ai, search_worker_alpha
+    search_worker_ai = ChessAI(chess_len, tt_size, rule=rule)
+    search_worker_alpha = shared_alpha
+def searchMoveWorker(task): #searchMoveWorker函数：在工作进程里搜索根节点的一个着法。
+    # 返回 (得分, 搜索时用的 alpha, 生成的着法数, 展开的着法数)，超时返回 None
+    ai = search_worker_ai
+    board, turn, depth, x, y, share, deadline, ai.use_lmr, ai.use_futility = task
+    alpha = search_worker_alpha.value if share else SCORE_MIN
+    ai.alpha = ai.belta = 0
+    ai.deadline = deadline
+    try:
+        score = ai.searchMove(board, turn, depth, x, y, alpha)
+    except SearchTimeout:
+        return None
+    finally:
+        ai.deadline = None
+    if share and score > alpha:
+        with search_worker_alpha.get_lock():
+            if score > search_worker_alpha.value:
+                search_worker_alpha.value = score
+    return (score, alpha, ai.alpha, ai.belta)
+def runLength(bits, pos): #runLength函数：位掩码 bits 中经过第 pos 位的连续 1 的个数。
+    length = 1
+    left = pos - 1
+    while left >= 0 and (bits >> left) & 1:
+        length += 1
+        left -= 1
+    right = pos + 1
+    while (bits >> right) & 1:
+        length += 1
+        right += 1
+    return length
+def buildPatternTable(): #buildPatternTable函数：用 analysisWindow 把所有中心为己方棋子的窗口判断一遍，结果存成表。
+    # PATTERN_TABLE[(己方 9 位掩码 << 9) | 对方 9 位掩码] = (((棋型, 个数), ...), 需要跳过的点的位掩码)
+    # analysisWindow 不使用 self，这里直接通过类调用
+    table = [None] * (1 << 18)
+    for key, line in enumerate(WINDOW_LINES):
+        if line is None or line[4] != 1:
+            continue
+        count = [0 for i in range(8)]
+        record = ChessAI.analysisWindow(None, line, 1, 2, count)
+        table[key] = (tuple((chess_type, num) for chess_type, num in enumerate(count) if num > 0), record)
+    return table
+PATTERN_TABLE = buildPatternTable()
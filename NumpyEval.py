@@ -0,0 +1,157 @@
+#用 NumPy 批量计算静态评分，结果和 ChessAI.evaluate 完全相同，用来分析大量对局时代替逐个棋子的 analysisLine。
+#NumPy 是可选依赖，没有安装时 available() 返回 False，Analysis.evaluatePositions 会自动改用纯 Python 的 evaluate。
+#只支持无禁手规则（RULE_FREESTYLE）：查表时看不出五连之外是否还有己方棋子，标准规则下的长连要用 ChessAI.evaluate 判断。
+#用法: python NumpyEval.py --positions 2000   （在随机局面上和 ChessAI.evaluate 比较，并输出两者的速度）
+import argparse
+import time
+from random import Random
+from MaxMin_AlphaBeta import *
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EDGE = 3 #棋盘外的点，分析时当作双方的对手
+BATCH_SIZE = 1024 #BatchEvaluator.evaluate 每批计算的棋盘数
+PATTERN_COUNTS = None #PATTERN_COUNTS[窗口编码] 是 PATTERN_TABLE 中各棋型的个数，形状 (1 << 18, 8)
+PATTERN_RECORDS = None #PATTERN_RECORDS[窗口编码] 是 PATTERN_TABLE 中需要跳过的点的位掩码
+EVALUATORS = {} #棋盘大小 -> BatchEvaluator，见 getEvaluator
+def available(): #available函数：是否安装了 NumPy。
+    return np is not None
+def buildTables(): #buildTables函数：把 PATTERN_TABLE 转成两个数组，只在第一次使用时生成。
+    global PATTERN_COUNTS, PATTERN_RECORDS
+    if PATTERN_COUNTS is None:
+        counts = np.zeros((len(PATTERN_TABLE), 8), dtype=np.int32)
+        records = np.zeros(len(PATTERN_TABLE), dtype=np.int64)
+        for key, entry in enumerate(PATTERN_TABLE):
+            if entry is not None:
+                for chess_type, num in entry[0]:
+                    counts[key, chess_type] = num
+                records[key] = entry[1]
+        PATTERN_COUNTS, PATTERN_RECORDS = counts, records
+    return PATTERN_COUNTS, PATTERN_RECORDS
+
+class BatchEvaluator():
+    #BatchEvaluator类：一次计算很多个棋盘的 evaluate。
+    # 棋盘叠成 (棋盘数, 格子数) 的数组，按 ChessAI.initLines 的线取出所有横、竖、斜线（两端各补 LINE_PAD 个棋盘外的点），
+    # 每个点周围 9 个点的窗口由 9 个错开的切片视图拼出编码，查 PATTERN_TABLE 得到棋型和需要跳过的点。
+    # 一条线上按 analysisWholeLine 的顺序逐点推进，被前面的棋型记录过的棋子不再计数，这一步对所有棋盘和所有线同时进行。
+    def __init__(self, chess_len=CHESS_LEN):
+        if np is None:
+            raise ImportError('NumPy is required for BatchEvaluator')
+        self.len = chess_len
+        self.counts, self.records = buildTables()
+        # 正序扫描的线排在前面，倒序扫描的（副对角线）排在后面，逐点推进时两部分分别从两端开始
+        lines = sorted(ChessAI(chess_len).lines, key=lambda line: line[2])
+        self.forward = sum(1 for line in lines if not line[2])
+        edge = chess_len * chess_len #补在棋盘数组最后的一个棋盘外的点
+        self.cells = np.full((len(lines), chess_len + 2 * LINE_PAD), edge, dtype=np.intp)
+        for i, (dir_index, cells, reverse) in enumerate(lines):
+            for k, (x, y) in enumerate(cells):
+                self.cells[i, k + LINE_PAD] = y * chess_len + x
+
+    def countPatterns(self, boards): #countPatterns函数：返回 (棋盘数, 2, 8) 的数组，是每个棋盘上黑白双方各种棋型的个数。
+        num, chess_len, forward = boards.shape[0], self.len, self.forward
+        padded = np.concatenate([boards.reshape(num, -1), np.full((num, 1), EDGE, dtype=boards.dtype)], axis=1)
+        # 数组排成 (线上的位置, 线, 棋盘)，按位置取的切片在内存中是连续的
+        lines = padded.T[self.cells.T]
+        result = np.zeros((num, 2, 8), dtype=np.int32)
+        for mine in (1, 2):
+            # 每个点编码为 (是己方 << 9) | 是对方，第 q 个窗口的编码是第 q 到 q + 8 个点的编码依次左移 0 到 8 位后相加，
+            # 和 analysisWholeLine 查表用的编码一样
+            cell_codes = ((lines == mine).astype(np.int32) << 9) | ((lines == 3 - mine) | (lines == EDGE))
+            keys = cell_codes[0:chess_len].copy()
+            for i in range(1, 9):
+                keys |= cell_codes[i:i + chess_len] << i
+            stones = lines[LINE_PAD:LINE_PAD + chess_len] == mine
+            records = self.records[keys]
+            active = np.zeros(stones.shape, dtype=bool)
+            covered = np.zeros(stones.shape[1:], dtype=np.int64) #每条线上已经被记录、要跳过的位
+            for k in range(chess_len):
+                for part, pos in ((slice(0, forward), k), (slice(forward, None), chess_len - 1 - k)):
+                    hit = stones[pos, part] & (((covered[part] >> (pos + LINE_PAD)) & 1) == 0)
+                    active[pos, part] = hit
+                    covered[part] |= np.where(hit, records[pos, part] << pos, 0)
+            pos_index, line_index, board_index = np.nonzero(active)
+            found = self.counts[keys[pos_index, line_index, board_index]]
+            for chess_type in range(8):
+                result[:, mine - 1, chess_type] = np.bincount(board_index, weights=found[:, chess_type], minlength=num)
+        return result
+
+    def evaluate(self, boards, turns, batch=BATCH_SIZE):
+        #evaluate函数：boards 形状 (棋盘数, 边长, 边长)，turns 形状 (棋盘数,)，返回每个棋盘的 evaluate 分数。
+        # 每次最多算 batch 个棋盘，限制中间数组占用的内存。
+        boards = np.asarray(boards, dtype=np.int8)
+        turns = np.asarray(turns, dtype=np.intp)
+        scores = np.zeros(len(turns), dtype=np.int64)
+        for start in range(0, len(turns), batch):
+            counts = self.countPatterns(boards[start:start + batch])
+            index = np.arange(counts.shape[0])
+            part = turns[start:start + batch]
+            mscore, oscore = scoreCounts(counts[index, part - 1], counts[index, 2 - part])
+            scores[start:start + batch] = mscore - oscore
+        return scores
+
+def getEvaluator(chess_len=CHESS_LEN): #getEvaluator函数：取某个棋盘大小的 BatchEvaluator，同样大小的只生成一次。
+    evaluator = EVALUATORS.get(chess_len)
+    if evaluator is None:
+        evaluator = BatchEvaluator(chess_len)
+        EVALUATORS[chess_len] = evaluator
+    return evaluator
+def scoreCounts(mine_count, opponent_count): #scoreCounts函数：ChessAI.getScore 的批量版本，按同样的顺序判断。
+    mine_count = mine_count.copy()
+    opponent_count = opponent_count.copy()
+    mine_count[:, FOUR] += mine_count[:, SFOUR] >= 2
+    opponent_count[:, FOUR] += opponent_count[:, SFOUR] >= 2
+    m, o = mine_count, opponent_count
+    mscore = ((m[:, THREE] > 1) * 500 + ((m[:, THREE] == 1) * 100)
+              + m[:, STHREE] * 10 + m[:, TWO] * 6 + m[:, STWO] * 2)
+    oscore = ((o[:, SFOUR] > 0) * 400 + (o[:, THREE] > 1) * 2000 + (o[:, THREE] == 1) * 400
+              + o[:, STHREE] * 10 + o[:, TWO] * 6 + o[:, STWO] * 2)
+    conditions = [
+        m[:, FIVE] > 0,
+        o[:, FIVE] > 0,
+        m[:, FOUR] > 0,
+        m[:, SFOUR] > 0,
+        o[:, FOUR] > 0,
+        (o[:, SFOUR] > 0) & (o[:, THREE] > 0),
+        (m[:, THREE] > 0) & (o[:, SFOUR] == 0),
+        (o[:, THREE] > 1) & (m[:, THREE] == 0) & (m[:, STHREE] == 0),
+    ]
+    mscore = np.select(conditions, [SCORE_FIVE, 0, 9050, 9040, 0, 0, 9010, 0], mscore)
+    oscore = np.select(conditions, [0, SCORE_FIVE, 0, 0, 9030, 9020, 0, 9000], oscore)
+    return mscore, oscore
+
+def randomPositions(num, chess_len, seed=0): #randomPositions函数：随机生成 num 个局面（黑白棋子数相等或黑棋多一个）。
+    rand = Random(seed)
+    positions = []
+    for i in range(num):
+        board = [[0 for x in range(chess_len)] for y in range(chess_len)]
+        stones = rand.randint(0, chess_len * chess_len // 3)
+        cells = rand.sample(range(chess_len * chess_len), stones)
+        for j, cell in enumerate(cells):
+            board[cell // chess_len][cell % chess_len] = 1 if j % 2 == 0 else 2
+        positions.append((board, rand.choice((1, 2))))
+    return positions
+def main():
+    parser = argparse.ArgumentParser(description='在随机局面上检查 NumPy 批量评分和 ChessAI.evaluate 是否一致')
+    parser.add_argument('--positions', type=int, default=1000, help='局面数')
+    parser.add_argument('--size', type=int, default=CHESS_LEN, help='棋盘大小')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    args = parser.parse_args()
+    positions = randomPositions(args.positions, args.size, args.seed)
+    ai = ChessAI(args.size)
+    start = time.perf_counter()
+    expect = [ai.evaluate(board, MAP_ENTRY_TYPE(turn)) for board, turn in positions]
+    python_time = time.perf_counter() - start
+    evaluator = BatchEvaluator(args.size)
+    start = time.perf_counter()
+    scores = evaluator.evaluate([board for board, turn in positions], [turn for board, turn in positions])
+    numpy_time = time.perf_counter() - start
+    mismatches = sum(1 for a, b in zip(expect, scores) if a != b)
+    print('%d 个局面，不一致 %d 个' % (len(positions), mismatches))
+    print('evaluate %.0f 局面/秒，NumPy %.0f 局面/秒' % (len(positions) / python_time, len(positions) / numpy_time))
+    if mismatches:
+        raise SystemExit(1)
+if __name__ == '__main__':
+    main()
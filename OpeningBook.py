@@ -0,0 +1,169 @@
+#开局库：按棋盘的 8 种对称变换归一化后的局面哈希保存每个局面的着法，文件用 mmap 打开后二分查找
+#用法: python OpeningBook.py games.jsonl --output book.bin --plies 10 --rule standard
+#文件格式（小端）: 文件头 magic 'GBBK', 版本 u16, 棋盘大小 u16, 最多步数 u16, 规则编号 u16（BOOK_RULES 中的下标）, 条目数 u32，
+#之后是按 key 排好序的条目: key u64, 着法（归一化后的格子编号 y * 棋盘大小 + x）u16, 胜局数 u16
+import argparse
+import json
+import mmap
+import struct
+from random import Random
+
+BOOK_MAGIC = b'GBBK'
+BOOK_VERSION = 2  #版本 2 在文件头里记录规则
+BOOK_SEED = 20201  #固定的随机种子，保证生成开局库和查找时的哈希一致
+BOOK_PLIES = 10  #默认只收录前 10 步
+BOOK_RULES = ('freestyle', 'standard')  #规则编号对应的规则，和 MaxMin_AlphaBeta.RULES 相同（MaxMin_AlphaBeta 导入本模块，这里不能反过来导入它）
+HEADER = struct.Struct('<4sHHHHI')
+ENTRY = struct.Struct('<QHH')
+
+def symmetryTables(chess_len): #symmetryTables函数：返回 8 种对称变换下每个格子变到哪个格子，以及它们的逆变换。
+    n = chess_len - 1
+    transforms = [lambda x, y: (x, y), lambda x, y: (n - x, y), lambda x, y: (x, n - y), lambda x, y: (n - x, n - y),
+                  lambda x, y: (y, x), lambda x, y: (n - y, x), lambda x, y: (y, n - x), lambda x, y: (n - y, n - x)]
+    perms = []
+    inverses = []
+    for transform in transforms:
+        perm = [0] * (chess_len * chess_len)
+        inverse = [0] * (chess_len * chess_len)
+        for y in range(chess_len):
+            for x in range(chess_len):
+                tx, ty = transform(x, y)
+                perm[y * chess_len + x] = ty * chess_len + tx
+                inverse[ty * chess_len + tx] = y * chess_len + x
+        perms.append(perm)
+        inverses.append(inverse)
+    return perms, inverses
+
+class BookHasher():
+    #BookHasher类：计算归一化的局面哈希。8 种对称变换各算一个 Zobrist 哈希，取最小的一个作为局面的 key。
+    def __init__(self, chess_len):
+        self.len = chess_len
+        rand = Random(BOOK_SEED)
+        cells = chess_len * chess_len
+        self.zobrist = [[rand.getrandbits(64) for i in range(cells)] for turn in range(2)]
+        self.turn_key = rand.getrandbits(64)  #轮到白棋走时异或上这个值
+        self.perms, self.inverses = symmetryTables(chess_len)
+
+    def stones(self, board): #stones函数：棋盘上所有棋子 (格子编号, 颜色) 的列表。
+        chess_len = self.len
+        return [(y * chess_len + x, board[y][x]) for y in range(chess_len) for x in range(chess_len) if board[y][x] != 0]
+
+    def canonical(self, stones, turn): #canonical函数：返回 (key, 对称变换编号)。
+        zobrist = self.zobrist
+        best_key = None
+        best = 0
+        for s, perm in enumerate(self.perms):
+            key = self.turn_key if turn == 2 else 0
+            for cell, color in stones:
+                key ^= zobrist[color - 1][perm[cell]]
+            if best_key is None or key < best_key:
+                best_key, best = key, s
+        return best_key, best
+
+class OpeningBook():
+    #OpeningBook类：只读的开局库，文件用 mmap 映射，不会整个读进内存。
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, chess_len, plies, rule, count = HEADER.unpack_from(self.data, 0)
+        if magic != BOOK_MAGIC or version != BOOK_VERSION or rule >= len(BOOK_RULES):
+            self.close()
+            raise ValueError('%s is not an opening book' % path)
+        if HEADER.size + count * ENTRY.size > len(self.data):
+            self.close()
+            raise ValueError('%s is truncated' % path)
+        self.len = chess_len
+        self.rule = BOOK_RULES[rule]
+        self.plies = plies
+        self.count = count
+        self.hasher = BookHasher(chess_len)
+
+    def find(self, key): #find函数：二分查找 key，返回 (着法, 胜局数)，没有时返回 None。
+        data = self.data
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            entry_key, move, weight = ENTRY.unpack_from(data, HEADER.size + mid * ENTRY.size)
+            if entry_key < key:
+                low = mid + 1
+            elif entry_key > key:
+                high = mid
+            else:
+                return move, weight
+        return None
+
+    def probe(self, board, turn): #probe函数：查开局库，返回着法 (x, y)，库里没有这个局面时返回 None。
+        if len(board) != self.len:
+            return None
+        stones = self.hasher.stones(board)
+        if len(stones) >= self.plies:
+            return None
+        key, s = self.hasher.canonical(stones, int(turn))
+        found = self.find(key)
+        if found is None:
+            return None
+        cell = self.hasher.inverses[s][found[0]]
+        x, y = cell % self.len, cell // self.len
+        if board[y][x] != 0:  #哈希冲突
+            return None
+        return (x, y)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+def buildBook(games, chess_len=15, plies=BOOK_PLIES, min_count=1, rule=BOOK_RULES[0]):
+    #buildBook函数：从对局记录（SelfPlay.py 输出的格式）统计开局库，返回 {key: (着法, 胜局数)}。
+    # 只用棋盘大小和规则都相同的对局，没有记录规则的对局按无禁手规则。
+    # 只收录胜方走的着法，同一局面取胜局最多的着法；出现次数少于 min_count 的局面不收录。
+    # 对局开头随机摆放的 opening 步不是胜方选的着法，只作为局面的一部分，不收录。
+    hasher = BookHasher(chess_len)
+    counts = {}
+    for game in games:
+        if game['size'] != chess_len or game.get('rule', BOOK_RULES[0]) != rule or game['winner'] == 0:
+            continue
+        stones = []
+        opening = game.get('opening', 0)
+        for i, (x, y) in enumerate(game['steps'][:plies]):
+            turn = 1 if i % 2 == 0 else 2
+            if i >= opening and turn == game['winner']:
+                key, s = hasher.canonical(stones, turn)
+                move = hasher.perms[s][y * chess_len + x]
+                moves = counts.setdefault(key, {})
+                moves[move] = moves.get(move, 0) + 1
+            stones.append((y * chess_len + x, turn))
+    book = {}
+    for key, moves in counts.items():
+        move = min(moves, key=lambda m: (-moves[m], m))
+        if moves[move] >= min_count:
+            book[key] = (move, min(moves[move], 0xFFFF))
+    return book
+
+def writeBook(path, book, chess_len=15, plies=BOOK_PLIES, rule=BOOK_RULES[0]): #writeBook函数：把 buildBook 的结果写成开局库文件。
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(BOOK_MAGIC, BOOK_VERSION, chess_len, plies, BOOK_RULES.index(rule), len(book)))
+        for key in sorted(book):
+            move, weight = book[key]
+            f.write(ENTRY.pack(key, move, weight))
+
+def readGames(paths): #readGames函数：逐行读取 JSON 对局记录。
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='从自我对弈的对局记录生成开局库')
+    parser.add_argument('games', nargs='+', help='对局记录文件（每行一盘 JSON）')
+    parser.add_argument('--output', default='book.bin', help='开局库文件')
+    parser.add_argument('--size', type=int, default=15, help='棋盘大小')
+    parser.add_argument('--plies', type=int, default=BOOK_PLIES, help='收录前多少步')
+    parser.add_argument('--min-count', type=int, default=1, help='局面至少出现的胜局数')
+    parser.add_argument('--rule', choices=BOOK_RULES, default=BOOK_RULES[0], help='只收录这个规则的对局，开局库只给同样规则的 AI 使用')
+    args = parser.parse_args()
+    book = buildBook(readGames(args.games), args.size, args.plies, args.min_count, args.rule)
+    writeBook(args.output, book, args.size, args.plies, args.rule)
+    print('%d 个局面写入 %s' % (len(book), args.output))
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#检查 PATTERN_TABLE：把中心为己方棋子的所有 3^8 = 6561 种 9 点窗口，分别交给原来逐点判断的 analysisLine
+#（BaselineAI，照原样保留）和现在查表的 ChessAI.analysisLine，比较两者的棋型统计和需要跳过的点，黑白双方各查一遍。
+#窗口两端以外的点不会被读到，棋盘外的点在两种实现里都当作对方棋子，所以 6561 种窗口覆盖了所有情况。
+#用法: python PatternCheck.py   （有不一致的窗口时打印出来，并以非零状态退出）
+import itertools
+from MaxMin_AlphaBeta import *
+
+WINDOW_SIZE = 9
+class BaselineAI(): #BaselineAI类：查表之前 ChessAI 逐点判断棋型的 getLine 和 analysisLine，只用来和 PATTERN_TABLE 比较
+    def __init__(self, chess_len):
+        self.len = chess_len
+        self.record = [[[0, 0, 0, 0] for x in range(chess_len)] for y in range(chess_len)]
+    def getLine(self, board, x, y, dir_offset, mine, opponent): #getLine函数，根据棋子的位置和方向，
+        # 获取上面说的长度为9的线。有个取巧的地方，如果线上的位置超出了棋盘范围，
+        # 就将这个位置的值设为对手的值，因为超出范围和被对手棋挡着，对棋型判断的结果是一样的
+        line = [0 for i in range(9)]
+        tmp_x = x + (-5 * dir_offset[0])
+        tmp_y = y + (-5 * dir_offset[1])
+        for i in range(9):
+            tmp_x += dir_offset[0]
+            tmp_y += dir_offset[1]
+            if (tmp_x < 0 or tmp_x >= self.len or
+                    tmp_y < 0 or tmp_y >= self.len):
+                line[i] = opponent  # set out of range as opponent chess
+            else:
+                line[i] = board[tmp_y][tmp_x]
+        return line
+    def analysisLine(self, board, x, y, dir_index, dir, mine, opponent, count):#analysisLine函数
+        # 是判断一条线上自己棋能形成棋型的代码， mine表示自己棋的值，opponent表示对手棋的值。
+        #要根据中心点相邻己方棋子能连成的个数来分别判断，己方棋值设为M，对方棋值设为P，空点值设为X。
+        def setRecord(self, x, y, left, right, dir_index, dir_offset):#setRecord函数 标记已经检测过，需要跳过的棋子。
+            tmp_x = x + (-5 + left) * dir_offset[0]
+            tmp_y = y + (-5 + left) * dir_offset[1]
+            for i in range(left, right + 1):
+                tmp_x += dir_offset[0]
+                tmp_y += dir_offset[1]
+                self.record[tmp_y][tmp_x][dir_index] = 1
+        empty = MAP_ENTRY_TYPE.MAP_EMPTY.value
+        left_idx, right_idx = 4, 4
+        line = self.getLine(board, x, y, dir, mine, opponent)
+        while right_idx < 8:
+            if line[right_idx + 1] != mine:
+                break
+            right_idx += 1
+        while left_idx > 0:
+            if line[left_idx - 1] != mine:
+                break
+            left_idx -= 1
+        left_range, right_range = left_idx, right_idx
+        while right_range < 8:
+            if line[right_range + 1] == opponent:
+                break
+            right_range += 1
+        while left_range > 0:
+            if line[left_range - 1] == opponent:
+                break
+            left_range -= 1
+        chess_range = right_range - left_range + 1
+        if chess_range < 5:
+            setRecord(self, x, y, left_range, right_range, dir_index, dir)
+            return CHESS_TYPE.NONE
+        setRecord(self, x, y, left_idx, right_idx, dir_index, dir)
+        m_range = right_idx - left_idx + 1
+        # M:自己的棋子, P:对手的棋子或者超出范围, X: 空
+        if m_range >= 5:
+            count[FIVE] += 1
+        # 活四的形式 : XMMMMX
+        # 冲四的形式 : XMMMMP, PMMMMX
+        if m_range == 4:
+            left_empty = right_empty = False
+            if line[left_idx - 1] == empty:
+                left_empty = True
+            if line[right_idx + 1] == empty:
+                right_empty = True
+            if left_empty and right_empty:
+                count[FOUR] += 1
+            elif left_empty or right_empty:
+                count[SFOUR] += 1
+        # 冲四 : MXMMM, MMMXM
+        # 活三 : XMMMXX, XXMMMX
+        # 眠三 : PMMMX, XMMMP, PXMMMXP
+        if m_range == 3:
+            left_empty = right_empty = False
+            left_four = right_four = False
+            if line[left_idx - 1] == empty:
+                if line[left_idx - 2] == mine:  # MXMMM
+                    setRecord(self, x, y, left_idx - 2, left_idx - 1, dir_index, dir)
+                    count[SFOUR] += 1
+                    left_four = True
+                left_empty = True
+            if line[right_idx + 1] == empty:
+                if line[right_idx + 2] == mine:  # MMMXM
+                    setRecord(self, x, y, right_idx + 1, right_idx + 2, dir_index, dir)
+                    count[SFOUR] += 1
+                    right_four = True
+                right_empty = True
+
+            if left_four or right_four:
+                pass
+            elif left_empty and right_empty:
+                if chess_range > 5:  # XMMMXX, XXMMMX
+                    count[THREE] += 1
+                else:  # PXMMMXP
+                    count[STHREE] += 1
+            elif left_empty or right_empty:  # PMMMX, XMMMP
+                count[STHREE] += 1
+        # 冲四: MMXMM
+        # 活三: XMXMMX, XMMXMX
+        # 眠三: PMXMMX, XMXMMP, PMMXMX, XMMXMP
+        # 活二: XMMX
+        # 眠二: PMMX, XMMP
+        if m_range == 2:
+            left_empty = right_empty = False
+            left_three = right_three = False
+            if line[left_idx - 1] == empty:
+                if line[left_idx - 2] == mine:
+                    setRecord(self, x, y, left_idx - 2, left_idx - 1, dir_index, dir)
+                    if line[left_idx - 3] == empty:
+                        if line[right_idx + 1] == empty:  # XMXMMX
+                            count[THREE] += 1
+                        else:  # XMXMMP
+                            count[STHREE] += 1
+                        left_three = True
+                    elif line[left_idx - 3] == opponent:  # PMXMMX
+                        if line[right_idx + 1] == empty:
+                            count[STHREE] += 1
+                            left_three = True
+                left_empty = True
+            if line[right_idx + 1] == empty:
+                if line[right_idx + 2] == mine:
+                    if line[right_idx + 3] == mine:  # MMXMM
+                        setRecord(self, x, y, right_idx + 1, right_idx + 2, dir_index, dir)
+                        count[SFOUR] += 1
+                        right_three = True
+                    elif line[right_idx + 3] == empty:
+                        if left_empty:  # XMMXMX
+                            count[THREE] += 1
+                        else:  # PMMXMX
+                            count[STHREE] += 1
+                        right_three = True
+                    elif left_empty:  # XMMXMP
+                        count[STHREE] += 1
+                        right_three = True
+                right_empty = True
+            if left_three or right_three:
+                pass
+            elif left_empty and right_empty:  # XMMX
+                count[TWO] += 1
+            elif left_empty or right_empty:  # PMMX, XMMP
+                count[STWO] += 1
+        # 活二: XMXMX, XMXXMX only check right direction
+        # 眠二: PMXMX, XMXMP
+        if m_range == 1:
+            left_empty = right_empty = False
+            if line[left_idx - 1] == empty:
+                if line[left_idx - 2] == mine:
+                    if line[left_idx - 3] == empty:
+                        if line[right_idx + 1] == opponent:  # XMXMP
+                            count[STWO] += 1
+                left_empty = True
+
+            if line[right_idx + 1] == empty:
+                if line[right_idx + 2] == mine:
+                    if line[right_idx + 3] == empty:
+                        if left_empty:  # XMXMX
+                            count[TWO] += 1
+                        else:  # PMXMX
+                            count[STWO] += 1
+                elif line[right_idx + 2] == empty:
+                    if line[right_idx + 3] == mine and line[right_idx + 4] == empty:  # XMXXMX
+                        count[TWO] += 1
+        return CHESS_TYPE.NONE
+def analyzeWindow(ai, line, mine, opponent): #analyzeWindow函数：把窗口放在 9x9 棋盘的第一行，返回 ai.analysisLine 的棋型统计和跳过标记。
+    board = [[0 for x in range(WINDOW_SIZE)] for y in range(WINDOW_SIZE)]
+    board[0] = list(line)
+    for row in ai.record:
+        for point in row:
+            point[0] = 0
+    count = [0 for i in range(8)]
+    ai.analysisLine(board, 4, 0, 0, (1, 0), mine, opponent, count)
+    return count, [ai.record[0][x][0] for x in range(WINDOW_SIZE)]
+def main():
+    baseline = BaselineAI(WINDOW_SIZE)
+    ai = ChessAI(WINDOW_SIZE, tt_size=1, rule=RULE_FREESTYLE)
+    checked = mismatches = 0
+    for mine, opponent in ((1, 2), (2, 1)):
+        for cells in itertools.product((0, mine, opponent), repeat=WINDOW_SIZE - 1):
+            line = cells[:4] + (mine,) + cells[4:]
+            expect = analyzeWindow(baseline, line, mine, opponent)
+            result = analyzeWindow(ai, line, mine, opponent)
+            checked += 1
+            if result != expect:
+                mismatches += 1
+                print('窗口 %s（己方 %d）：原来 %s，查表 %s' % (''.join(str(v) for v in line), mine, expect, result))
+    print('%d 个窗口，不一致 %d 个' % (checked, mismatches))
+    if mismatches:
+        raise SystemExit(1)
+if __name__ == '__main__':
+    main()
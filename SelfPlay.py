@@ -0,0 +1,127 @@
+#无界面的 AI 自我对弈，用来测试引擎的速度和生成对局数据
+#用法: python SelfPlay.py --games 20 --depth 3 --workers 4 --output games.jsonl
+import argparse
+import json
+import multiprocessing
+import time
+from random import Random
+from MaxMin_AlphaBeta import *
+
+selfplay_ai = None #每个工作进程自己的 ChessAI
+def initSelfPlayWorker(chess_len, rule): #initSelfPlayWorker函数：进程池的初始化函数。
+    global selfplay_ai
+    selfplay_ai = ChessAI(chess_len, rule=rule)
+def randomOpening(board, rand, num): #randomOpening函数：在棋盘中心附近随机摆 num 手棋作为开局，返回摆出的着法。
+    chess_len = len(board)
+    center = chess_len // 2
+    steps = []
+    turn = MAP_ENTRY_TYPE.MAP_PLAYER_ONE
+    while len(steps) < num:
+        x = center + rand.randint(-2, 2)
+        y = center + rand.randint(-2, 2)
+        if board[y][x] != 0:
+            continue
+        board[y][x] = turn.value
+        steps.append((x, y))
+        if turn == MAP_ENTRY_TYPE.MAP_PLAYER_ONE:
+            turn = MAP_ENTRY_TYPE.MAP_PLAYER_TWO
+        else:
+            turn = MAP_ENTRY_TYPE.MAP_PLAYER_ONE
+    return steps
+def playGame(task): #playGame函数：下一盘自我对弈，返回对局记录和每步的搜索统计。
+    index, chess_len, depth, time_limit, opening, seed = task
+    ai = selfplay_ai
+    rand = Random(seed + index)
+    board = [[0 for x in range(chess_len)] for y in range(chess_len)]
+    steps = randomOpening(board, rand, opening)
+    turn = MAP_ENTRY_TYPE.MAP_PLAYER_ONE if len(steps) % 2 == 0 else MAP_ENTRY_TYPE.MAP_PLAYER_TWO
+    winner = 0
+    latency = []
+    nodes = 0
+    while len(steps) < chess_len * chess_len:
+        x, y = ai.findBestChess(board, turn, time_limit, depth)
+        latency.append(ai.search_time)
+        nodes += ai.belta
+        board[y][x] = turn.value
+        steps.append((x, y))
+        if ai.isWinMove(board, x, y):
+            winner = turn.value
+            break
+        if turn == MAP_ENTRY_TYPE.MAP_PLAYER_ONE:
+            turn = MAP_ENTRY_TYPE.MAP_PLAYER_TWO
+        else:
+            turn = MAP_ENTRY_TYPE.MAP_PLAYER_ONE
+    return {'size': chess_len, 'opening': opening, 'steps': steps, 'winner': winner,
+            'latency': latency, 'nodes': nodes}
+def percentile(values, p): #percentile函数：取排好序的数据的第 p 百分位数。
+    if len(values) == 0:
+        return 0
+    index = min(len(values) - 1, int(len(values) * p / 100))
+    return values[index]
+def selfPlay(games, chess_len=CHESS_LEN, depth=3, time_limit=None, opening=2, workers=1, seed=0, output=None, rule=RULE):
+    #selfPlay函数：用进程池下 games 盘棋，返回统计结果；output 不为 None 时把每盘棋按一行 JSON 写入该文件。
+    start = time.time()
+    tasks = [(i, chess_len, depth, time_limit, opening, seed) for i in range(games)]
+    pool = multiprocessing.Pool(workers, initializer=initSelfPlayWorker, initargs=(chess_len, rule))
+    latency = []
+    nodes = moves = 0
+    winners = [0, 0, 0]
+    out = open(output, 'a') if output is not None else None
+    try:
+        for game in pool.imap_unordered(playGame, tasks):
+            latency.extend(game['latency'])
+            nodes += game['nodes']
+            moves += len(game['latency'])
+            winners[game['winner']] += 1
+            if out is not None:
+                out.write(json.dumps({'size': game['size'], 'rule': rule, 'opening': game['opening'],
+                                      'steps': game['steps'], 'winner': game['winner']}) + '\n')
+    finally:
+        pool.close()
+        pool.join()
+        if out is not None:
+            out.close()
+    elapsed = time.time() - start
+    search_time = sum(latency)
+    latency.sort()
+    return {
+        'games': games,
+        'moves': moves,
+        'seconds': elapsed,
+        'games_per_sec': games / elapsed,
+        'moves_per_sec': moves / elapsed,
+        'nodes_per_sec': nodes / search_time if search_time > 0 else 0,
+        'latency_p50': percentile(latency, 50),
+        'latency_p90': percentile(latency, 90),
+        'latency_p99': percentile(latency, 99),
+        'latency_max': latency[-1] if latency else 0,
+        'black_wins': winners[1],
+        'white_wins': winners[2],
+        'draws': winners[0],
+    }
+def main():
+    parser = argparse.ArgumentParser(description='五子棋 AI 自我对弈')
+    parser.add_argument('--games', type=int, default=10, help='对局数')
+    parser.add_argument('--depth', type=int, default=3, help='搜索深度')
+    parser.add_argument('--time-limit', type=float, default=None, help='每步限时（秒），设置后按迭代加深搜索')
+    parser.add_argument('--size', type=int, default=CHESS_LEN, help='棋盘大小')
+    parser.add_argument('--rule', choices=RULES, default=RULE, help='freestyle 长连也算胜，standard 只有正好五连算胜')
+    parser.add_argument('--opening', type=int, default=2, help='开局随机摆放的棋子数')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='进程数')
+    parser.add_argument('--seed', type=int, default=0, help='随机开局的种子')
+    parser.add_argument('--output', default=None, help='对局记录输出文件（每行一盘 JSON）')
+    parser.add_argument('--json', action='store_true', help='以 JSON 格式输出统计结果')
+    args = parser.parse_args()
+    result = selfPlay(args.games, args.size, args.depth, args.time_limit, args.opening,
+                      args.workers, args.seed, args.output, args.rule)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print('对局 %d 盘，共 %d 步，用时 %.2f 秒' % (result['games'], result['moves'], result['seconds']))
+        print('games/sec %.3f  moves/sec %.2f  nodes/sec %.0f' % (
+            result['games_per_sec'], result['moves_per_sec'], result['nodes_per_sec']))
+        print('每步用时 p50 %.3f  p90 %.3f  p99 %.3f  max %.3f' % (
+            result['latency_p50'], result['latency_p90'], result['latency_p99'], result['latency_max']))
+        print('黑胜 %d  白胜 %d  和棋 %d' % (result['black_wins'], result['white_wins'], result['draws']))
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+#无界面的对局服务器：用 asyncio 同时管理很多盘棋，搜索交给固定大小的进程池。
+#协议：每行一个 JSON 请求，服务器按行返回 JSON 结果，结果带着请求里的 id。
+#  {"op": "new", "size": 15, "rule": "freestyle"}            -> {"ok": true, "game": 1}
+#  {"op": "move", "game": 1, "x": 7, "y": 7}                  -> {"ok": true, "winner": 0}
+#  {"op": "best", "game": 1, "time": 0.5, "nodes": 20000, "depth": 5, "play": true}
+#     （time、nodes、depth 都是上限，任意一个先到就停；没有给出 time 时最多搜索 MAX_TIME 秒）
+#                                                             -> {"ok": true, "move": [8, 8], "score": 12, "depth": 4, "nodes": 1873, ...}
+#  {"op": "close", "game": 1}                                 -> {"ok": true}
+#  {"op": "stats"}                                            -> {"ok": true, "queued": 0, "running": 2, "latency_p50": ...}
+#出错时返回 {"ok": false, "error": "..."}；进程池排队的搜索太多时 best 请求直接返回 {"ok": false, "error": "busy"}，客户端稍后重试。
+#用法: python Server.py --port 7777 --workers 4
+#      python Server.py --unix /tmp/gobang.sock
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from MaxMin_AlphaBeta import *
+from SelfPlay import percentile
+
+SERVER_WORKERS = multiprocessing.cpu_count() #进程池大小
+MAX_QUEUED = 16        #除了正在搜索的，最多还能排队等待的搜索数，再多就返回 busy
+MAX_TIME = 10.0        #每次搜索允许的最长时间（秒）
+MAX_NODES = 1000000    #每次搜索允许的最多节点数
+DEFAULT_TIME = 1.0     #请求里没有给出 time、nodes 和 depth 时的搜索时间（秒）
+LATENCY_WINDOW = 1000  #统计延迟用的最近请求数
+MAX_LINE = 1 << 16     #一行请求的最大长度
+
+server_ais = {} #每个工作进程里按 (棋盘大小, 规则) 缓存的 ChessAI
+def searchWorker(task): #searchWorker函数：在工作进程里按迭代加深搜索一个局面，总有时间上限，不会一直占着工作进程。
+    chess_len, rule, board, turn, time_limit, max_depth, node_limit = task
+    ai = server_ais.get((chess_len, rule))
+    if ai is None:
+        ai = ChessAI(chess_len, rule=rule)
+        server_ais[(chess_len, rule)] = ai
+    x, y = ai.findBestChess(board, MAP_ENTRY_TYPE(turn), time_limit, node_limit=node_limit, max_depth=max_depth)
+    return {'move': [x, y], 'score': ai.search_score, 'depth': ai.search_depth, 'nodes': ai.belta,
+            'search_time': ai.search_time}
+
+class RequestError(Exception):
+    #RequestError类：请求不合法，错误信息原样返回给客户端。
+    pass
+
+class ServerGame():
+    #ServerGame类：服务器上的一盘棋。
+    def __init__(self, chess_len, rule):
+        self.len = chess_len
+        self.rule = rule
+        self.board = [[0 for x in range(chess_len)] for y in range(chess_len)]
+        self.turn = MAP_ENTRY_TYPE.MAP_PLAYER_ONE
+        self.steps = []
+        self.winner = 0
+        self.searching = False #同一盘棋同时只能有一个搜索
+    def play(self, x, y, ai): #play函数：当前一方落子，返回胜方（0 表示还没分出胜负）。
+        if self.winner != 0:
+            raise RequestError('game is over')
+        if not (0 <= x < self.len and 0 <= y < self.len) or self.board[y][x] != 0:
+            raise RequestError('illegal move')
+        self.board[y][x] = self.turn.value
+        self.steps.append((x, y))
+        if ai.isWinMove(self.board, x, y):
+            self.winner = self.turn.value
+        elif self.turn == MAP_ENTRY_TYPE.MAP_PLAYER_ONE:
+            self.turn = MAP_ENTRY_TYPE.MAP_PLAYER_TWO
+        else:
+            self.turn = MAP_ENTRY_TYPE.MAP_PLAYER_ONE
+        return self.winner
+
+class EngineServer():
+    #EngineServer类：处理客户端连接和请求。对局状态保存在事件循环所在的线程里，只有搜索交给进程池。
+    # 进程池里正在搜索和排队的请求一共不超过 workers + max_queued 个，超过时新的 best 请求立即返回 busy，
+    # 同一个连接上的请求按顺序处理，客户端不读结果时服务器也不再读它的请求。
+    def __init__(self, workers=SERVER_WORKERS, max_queued=MAX_QUEUED):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.executor = ProcessPoolExecutor(workers)
+        self.games = {}
+        self.game_ids = itertools.count(1)
+        self.ais = {} #事件循环里用来判断胜负的 ChessAI，只用 isWinMove，不搜索
+        self.pending = 0 #已经交给进程池还没完成的搜索数
+        self.latency = collections.deque(maxlen=LATENCY_WINDOW) #最近的 best 请求从收到到返回的时间
+        self.counters = collections.Counter()
+        self.start_time = time.time()
+        self.server = None
+        self.connections = {} #正在处理的连接: 任务 -> writer
+
+    async def start(self, host='127.0.0.1', port=0, unix=None): #start函数：开始监听，port 为 0 时由系统分配端口，返回监听的地址。
+        if unix is not None:
+            self.server = await asyncio.start_unix_server(self.handle, unix, limit=MAX_LINE)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        return self.server.sockets[0].getsockname()
+    async def close(self): #close函数：停止监听，断开所有连接，等正在处理的请求结束后关闭进程池。
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        for writer in self.connections.values():
+            writer.close()
+        if self.connections:
+            await asyncio.wait(list(self.connections))
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def handle(self, reader, writer): #handle函数：处理一个连接，直到客户端断开。
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(b'{"ok": false, "error": "request too long"}\n')
+                    break
+                if not line:
+                    break
+                response = await self.dispatch(line)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            del self.connections[task]
+            writer.close()
+
+    async def dispatch(self, line): #dispatch函数：解析一行请求，返回结果。
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                raise RequestError('invalid json')
+            if not isinstance(request, dict):
+                raise RequestError('request must be an object')
+            request_id = request.get('id')
+            handler = self.handlers.get(request.get('op'))
+            if handler is None:
+                raise RequestError('unknown op %r' % request.get('op'))
+            self.counters[request['op']] += 1
+            response = await handler(self, request)
+            response['ok'] = True
+        except RequestError as e:
+            self.counters['errors'] += 1
+            response = {'ok': False, 'error': str(e)}
+        except Exception as e: #搜索进程出错等，只让这个请求失败，连接和服务器继续工作
+            self.counters['errors'] += 1
+            response = {'ok': False, 'error': 'internal error: %r' % e}
+        if request_id is not None:
+            response['id'] = request_id
+        return response
+
+    def getGame(self, request): #getGame函数：按请求里的 game 取对局。
+        game = self.games.get(request.get('game'))
+        if game is None:
+            raise RequestError('unknown game')
+        return game
+    def getAI(self, chess_len, rule):
+        ai = self.ais.get((chess_len, rule))
+        if ai is None:
+            ai = ChessAI(chess_len, rule=rule)
+            self.ais[(chess_len, rule)] = ai
+        return ai
+    def getNumber(self, request, name, kind, low, high): #getNumber函数：取请求里的数值参数，没有时返回 None。
+        value = request.get(name)
+        if value is None:
+            return None
+        if not isinstance(value, (int, float)) or isinstance(value, bool) or not low <= value <= high or value != kind(value):
+            raise RequestError('%s must be %s in [%s, %s]' % (name, 'an integer' if kind is int else 'a number', low, high))
+        return kind(value)
+
+    async def newGame(self, request):
+        chess_len = self.getNumber(request, 'size', int, 5, 25) or CHESS_LEN
+        rule = request.get('rule', RULE)
+        if rule not in RULES:
+            raise RequestError('unknown rule %r' % rule)
+        game_id = next(self.game_ids)
+        self.games[game_id] = ServerGame(chess_len, rule)
+        return {'game': game_id}
+    async def move(self, request):
+        game = self.getGame(request)
+        if game.searching:
+            raise RequestError('game is searching')
+        x = self.getNumber(request, 'x', int, 0, game.len - 1)
+        y = self.getNumber(request, 'y', int, 0, game.len - 1)
+        if x is None or y is None:
+            raise RequestError('x and y are required')
+        return {'winner': game.play(x, y, self.getAI(game.len, game.rule))}
+    async def bestMove(self, request):
+        start = time.perf_counter()
+        game = self.getGame(request)
+        if game.winner != 0:
+            raise RequestError('game is over')
+        if game.searching:
+            raise RequestError('game is searching')
+        if len(game.steps) == game.len * game.len:
+            raise RequestError('board is full')
+        time_limit = self.getNumber(request, 'time', float, 0.0, MAX_TIME)
+        node_limit = self.getNumber(request, 'nodes', int, 1, MAX_NODES)
+        depth = self.getNumber(request, 'depth', int, 1, MAX_SEARCH_DEPTH)
+        if time_limit is None:
+            # 只给了 nodes 或 depth 时也要有截止时间，固定深度搜索的用时随深度指数增长
+            time_limit = DEFAULT_TIME if node_limit is None and depth is None else MAX_TIME
+        if self.pending >= self.workers + self.max_queued:
+            self.counters['rejected'] += 1
+            raise RequestError('busy')
+        task = (game.len, game.rule, [list(row) for row in game.board], game.turn.value, time_limit, depth or MAX_SEARCH_DEPTH, node_limit)
+        self.pending += 1
+        game.searching = True
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.executor, searchWorker, task)
+        finally:
+            self.pending -= 1
+            game.searching = False
+        if request.get('play'):
+            result['winner'] = game.play(result['move'][0], result['move'][1], self.getAI(game.len, game.rule))
+        result['latency'] = time.perf_counter() - start
+        self.latency.append(result['latency'])
+        return result
+    async def closeGame(self, request):
+        game = self.getGame(request)
+        if game.searching:
+            raise RequestError('game is searching')
+        del self.games[request['game']]
+        return {}
+    async def stats(self, request):
+        latency = sorted(self.latency)
+        return {
+            'games': len(self.games),
+            'workers': self.workers,
+            'running': min(self.pending, self.workers),
+            'queued': max(0, self.pending - self.workers),
+            'requests': dict(self.counters),
+            'latency_p50': percentile(latency, 50),
+            'latency_p90': percentile(latency, 90),
+            'latency_p99': percentile(latency, 99),
+            'latency_max': latency[-1] if latency else 0,
+            'uptime': time.time() - self.start_time,
+        }
+    handlers = {'new': newGame, 'move': move, 'best': bestMove, 'close': closeGame, 'stats': stats}
+
+class EngineClient():
+    #EngineClient类：服务器的简单客户端，一个连接上依次发送请求。
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count(1)
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=None, unix=None):
+        if unix is not None:
+            reader, writer = await asyncio.open_unix_connection(unix)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+    async def request(self, op, **params): #request函数：发送一个请求，返回结果。
+        params['op'] = op
+        params['id'] = next(self.ids)
+        self.writer.write(json.dumps(params).encode() + b'\n')
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def serve(args):
+    server = EngineServer(args.workers, args.max_queued)
+    address = await server.start(args.host, args.port, args.unix)
+    print('listening on %s' % (address,), flush=True)
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+def main():
+    parser = argparse.ArgumentParser(description='五子棋对局服务器（每行一个 JSON 请求）')
+    parser.add_argument('--host', default='127.0.0.1', help='监听的地址')
+    parser.add_argument('--port', type=int, default=7777, help='监听的端口')
+    parser.add_argument('--unix', default=None, help='改为监听这个 Unix socket 文件')
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS, help='搜索进程数')
+    parser.add_argument('--max-queued', type=int, default=MAX_QUEUED, help='最多排队等待的搜索数，再多就返回 busy')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+if __name__ == '__main__':
+    main()